@@ -1,73 +1,64 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.spatial import cKDTree
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-
-# Load the data
-cresis_data = pd.read_csv('snr_data.csv')
-utig_data = pd.read_csv('snr.csv')
-
-# Extract coordinates and SNR values
-cresis_coords = cresis_data[['x', 'y']].values
-utig_coords = utig_data[['x', 'y']].values
-cresis_snr = cresis_data['snr'].values
-utig_snr = utig_data['snr'].values
-
-# Reverse UTIG SNR values by multiplying by -1
-utig_snr = utig_snr * -1
-utig_data['snr'] = utig_snr
-
-# Build a KD-tree for UTIG data
-utig_tree = cKDTree(utig_coords)
-
-# Define a distance threshold for matching points
-threshold = 5000
-distances, indices = utig_tree.query(cresis_coords, distance_upper_bound=threshold)
-
-# Filter points within the threshold
-valid = distances < threshold
-cresis_close = cresis_data.iloc[valid]
-utig_close = utig_data.iloc[indices[valid]]
-
-# Create a DataFrame with close points and their SNR values
-close_points_df = pd.DataFrame({
-    'x_cresis': cresis_close['x'],
-    'y_cresis': cresis_close['y'],
-    'snr_cresis': cresis_close['snr'],
-    'x_utig': utig_close['x'].values,
-    'y_utig': utig_close['y'].values,
-    'snr_utig': utig_close['snr'].values
-})
-
-# Save the DataFrame to a CSV file
-close_points_csv_path = 'close_points_snr_comparison.csv'
-close_points_df.to_csv(close_points_csv_path, index=False)
-print(f'Close points with SNR values saved to {close_points_csv_path}')
-
-# Define the Spectral colormap
-spectral_cmap = plt.cm.Spectral
-
-# Plotting the data on an Antarctica map
-fig, axes = plt.subplots(1, 2, figsize=(12, 6), subplot_kw={'projection': ccrs.SouthPolarStereo()})
-
-# Plot for Cresis data with the Spectral colormap
-sc1 = axes[0].scatter(cresis_close['x'], cresis_close['y'], c=cresis_close['snr'], cmap=spectral_cmap, s=20, edgecolor='none', alpha=0.75, vmin=-40, vmax=120, transform=ccrs.SouthPolarStereo())
-axes[0].add_feature(cfeature.LAND, edgecolor='black')
-axes[0].coastlines(resolution='50m')
-axes[0].set_title('Cresis Data')
-plt.colorbar(sc1, ax=axes[0], label='Cresis SNR')
-
-# Plot for UTIG data with the Spectral colormap (after reversing SNR values)
-sc2 = axes[1].scatter(utig_close['x'], utig_close['y'], c=utig_close['snr'], cmap=spectral_cmap, s=20, edgecolor='none', alpha=0.75, vmin=-40, vmax=120, transform=ccrs.SouthPolarStereo())
-axes[1].add_feature(cfeature.LAND, edgecolor='black')
-axes[1].coastlines(resolution='50m')
-axes[1].set_title('UTIG Data')
-plt.colorbar(sc2, ax=axes[1], label='UTIG SNR')
-
-# Adjust layout and display the plot
-plt.tight_layout()
-plt.show()
-
-
+import argparse
+import os
+
+import pandas as pd
+
+from snr_comparison import load_snr_dataset, compare_snr_datasets
+
+def plot_matched_pairs(pairs_path, name_a, name_b, output_path):
+    """
+    Save maps of the SNR of both datasets at their matched points.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+
+    pairs = pd.read_parquet(pairs_path)
+
+    # Define the Spectral colormap
+    spectral_cmap = plt.cm.Spectral
+
+    fig, axes = plt.subplots(1, 2, figsize=(12, 6), subplot_kw={'projection': ccrs.SouthPolarStereo()})
+
+    for ax, name in zip(axes, (name_a, name_b)):
+        sc = ax.scatter(pairs[f'x_{name}'], pairs[f'y_{name}'], c=pairs[f'snr_{name}'], cmap=spectral_cmap, s=20, edgecolor='none', alpha=0.75, vmin=-40, vmax=120, transform=ccrs.SouthPolarStereo())
+        ax.add_feature(cfeature.LAND, edgecolor='black')
+        ax.coastlines(resolution='50m')
+        ax.set_title(name)
+        plt.colorbar(sc, ax=ax, label=f'{name} SNR')
+
+    plt.tight_layout()
+    fig.savefig(output_path, dpi=150)
+    plt.close(fig)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare SNR datasets at nearby points.")
+    parser.add_argument('--dataset', type=str, action='append', required=True,
+                        help="Dataset to compare as name=path, where path is an SNR CSV file or a directory of xOPR reflectivity zarr stores. Repeat for each dataset (at least two)")
+    parser.add_argument('--negate', type=str, action='append', default=[],
+                        help="Name of a dataset whose SNR should be multiplied by -1 (e.g. the UTIG dataset). May be repeated")
+    parser.add_argument('--max-distance', type=float, default=5000, help="Maximum distance between matched points, in meters")
+    parser.add_argument('--region-size', type=float, default=100_000, help="Size of the square regions used for per-region statistics, in meters")
+    parser.add_argument('--crs', type=str, default='EPSG:3031', help="Projected CRS for datasets given in latitude and longitude (xOPR)")
+    parser.add_argument('--output', type=str, default='snr_comparison', help="Output directory for matched pairs and summary statistics")
+    parser.add_argument('--plot', action='store_true', help="Also save maps of the matched points of each pair of datasets")
+    args = parser.parse_args()
+
+    datasets = {}
+    for spec in args.dataset:
+        name, path = spec.split('=', 1)
+        datasets[name] = load_snr_dataset(path, negate_snr=name in args.negate, crs=args.crs)
+        print(f"Loaded {len(datasets[name])} points from {path} as {name}")
+
+    summary = compare_snr_datasets(datasets, args.output, max_distance=args.max_distance, region_size=args.region_size)
+    print(f"Matched pairs and summary statistics saved to {args.output}")
+    print(summary[summary['region'] == 'all'].to_string(index=False))
+
+    if args.plot:
+        names = list(datasets)
+        for i, name_a in enumerate(names):
+            for name_b in names[i + 1:]:
+                pairs_path = os.path.join(args.output, f'pairs_{name_a}__{name_b}.parquet')
+                plot_matched_pairs(pairs_path, name_a, name_b, os.path.join(args.output, f'pairs_{name_a}__{name_b}.png'))
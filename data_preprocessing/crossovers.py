@@ -0,0 +1,257 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from snr_comparison import load_xopr_reflectivity
+
+CROSSOVER_VARIABLES = ['surface_power_dB', 'bed_power_dB', 'snr']
+
+def load_snr_csv_tracks(path):
+    """
+    Load flight tracks from an SNR CSV written by raw_to_snr.py.
+
+    Flights are identified by the season directory and the date and segment in the frame file
+    name (e.g. 'Data_20161026_05_001.csv' belongs to flight 20161026_05). Frames are sorted by
+    file name, so rows are in along-track order within each flight.
+
+    Returns:
+        pd.DataFrame: Columns 'x', 'y', 'flight' and CROSSOVER_VARIABLES
+    """
+    df = pd.read_csv(path, usecols=['x', 'y', 'snr', 'surface_pwr_db', 'bottom_pwr_db', 'source_csv_file', 'source_dir'],
+                     dtype={'snr': np.float32, 'surface_pwr_db': np.float32, 'bottom_pwr_db': np.float32})
+    df = df.rename(columns={'surface_pwr_db': 'surface_power_dB', 'bottom_pwr_db': 'bed_power_dB'})
+
+    segment = df['source_csv_file'].str.split('_').str[1:3].str.join('_')
+    df['flight'] = df['source_dir'] + '/' + segment
+    df = df.sort_values(['flight', 'source_csv_file'], kind='stable').drop(columns=['source_csv_file', 'source_dir'])
+    return df.dropna(subset=['x', 'y']).reset_index(drop=True)
+
+def simplify_track(x, y, tolerance):
+    """
+    Douglas-Peucker simplification of a polyline.
+
+    Parameters:
+        x, y (np.ndarray): Vertices of the polyline
+        tolerance (float): Maximum distance of any original vertex from the simplified polyline
+
+    Returns:
+        np.ndarray: Indices of the vertices kept, in order (always including the first and last)
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        # Distance of the interior vertices from the segment start -> end
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length_sq = dx**2 + dy**2
+        t = np.clip((px * dx + py * dy) / length_sq, 0, 1) if length_sq > 0 else 0
+        d = np.hypot(px - t * dx, py - t * dy)
+
+        k = np.argmax(d)
+        if d[k] > tolerance:
+            mid = start + 1 + k
+            keep[mid] = True
+            stack.extend([(start, mid), (mid, end)])
+
+    return np.flatnonzero(keep)
+
+def track_segments(tracks, tolerance=50, max_gap=2000):
+    """
+    Split each flight into simplified straight segments.
+
+    Each flight is broken wherever consecutive points are more than max_gap apart (so no segment
+    spans a data gap) and each piece is simplified with simplify_track.
+
+    Parameters:
+        tracks (pd.DataFrame): Points with 'x', 'y' and 'flight' columns, in along-track order within each flight
+        tolerance (float): Simplification tolerance
+        max_gap (float): Distance between consecutive points above which the track is broken
+
+    Returns:
+        dict: Arrays with one entry per segment: 'start' and 'end' (row positions in tracks of the
+        segment end points), 'flight' (flight code), 'x0', 'y0', 'x1', 'y1'
+    """
+    x = tracks['x'].to_numpy(dtype=np.float64)
+    y = tracks['y'].to_numpy(dtype=np.float64)
+    flight_codes, flights = pd.factorize(tracks['flight'])
+
+    # Break between flights and at gaps
+    breaks = np.flatnonzero((np.diff(flight_codes) != 0) | (np.hypot(np.diff(x), np.diff(y)) > max_gap)) + 1
+    piece_bounds = np.concatenate(([0], breaks, [len(x)]))
+
+    starts, ends = [], []
+    for p0, p1 in zip(piece_bounds[:-1], piece_bounds[1:]):
+        if p1 - p0 < 2:
+            continue
+        kept = p0 + simplify_track(x[p0:p1], y[p0:p1], tolerance)
+        starts.append(kept[:-1])
+        ends.append(kept[1:])
+
+    start = np.concatenate(starts) if starts else np.array([], dtype=np.int64)
+    end = np.concatenate(ends) if ends else np.array([], dtype=np.int64)
+    return {
+        'start': start, 'end': end, 'flight': flight_codes[start], 'flight_names': np.asarray(flights),
+        'x0': x[start], 'y0': y[start], 'x1': x[end], 'y1': y[end],
+    }
+
+def _candidate_pairs(segments, cell_size):
+    """
+    Pairs of segments whose bounding boxes share a grid cell, with the shared cell of each pair.
+
+    A pair sharing several cells is returned once per cell. find_crossovers keeps only the copy
+    whose cell contains the intersection, so each crossover is reported once.
+    """
+    cx0 = np.floor(np.minimum(segments['x0'], segments['x1']) / cell_size).astype(np.int64)
+    cx1 = np.floor(np.maximum(segments['x0'], segments['x1']) / cell_size).astype(np.int64)
+    cy0 = np.floor(np.minimum(segments['y0'], segments['y1']) / cell_size).astype(np.int64)
+    cy1 = np.floor(np.maximum(segments['y0'], segments['y1']) / cell_size).astype(np.int64)
+
+    # One (cell, segment) entry per cell covered by each segment's bounding box
+    nx, ny = cx1 - cx0 + 1, cy1 - cy0 + 1
+    n_cells = nx * ny
+    seg = np.repeat(np.arange(len(cx0)), n_cells)
+    local = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+    cell_x = cx0[seg] + local % nx[seg]
+    cell_y = cy0[seg] + local // nx[seg]
+
+    order = np.lexsort((seg, cell_y, cell_x))
+    seg, cell_x, cell_y = seg[order], cell_x[order], cell_y[order]
+
+    # Pair every entry with the entries after it in the same cell
+    new_cell = np.concatenate(([True], (np.diff(cell_x) != 0) | (np.diff(cell_y) != 0)))
+    cell_start = np.maximum.accumulate(np.where(new_cell, np.arange(len(seg)), 0))
+    cell_size_of_entry = np.diff(np.append(np.flatnonzero(new_cell), len(seg)))[np.cumsum(new_cell) - 1]
+    n_later = cell_size_of_entry - 1 - (np.arange(len(seg)) - cell_start)
+
+    left = np.repeat(np.arange(len(seg)), n_later)
+    step = np.arange(n_later.sum()) - np.repeat(np.cumsum(n_later) - n_later, n_later)
+    right = left + 1 + step
+
+    return seg[left], seg[right], cell_x[left], cell_y[left]
+
+def _nearest_sample(x, y, start, end, px, py):
+    """
+    Row position of the original point between start and end (inclusive) closest to (px, py), and its distance.
+    """
+    idx = np.empty(len(start), dtype=np.int64)
+    dist = np.empty(len(start), dtype=np.float64)
+    for i in range(len(start)):
+        d = np.hypot(x[start[i]:end[i] + 1] - px[i], y[start[i]:end[i] + 1] - py[i])
+        k = np.argmin(d)
+        idx[i], dist[i] = start[i] + k, d[k]
+    return idx, dist
+
+def find_crossovers(tracks, variables=CROSSOVER_VARIABLES, tolerance=50, max_gap=2000, cell_size=10_000,
+                    max_sample_distance=500, include_self_crossings=True):
+    """
+    Find all crossovers between flight tracks and the differences of variables at each one.
+
+    Tracks are simplified into segments (see track_segments), and the segments are indexed in a
+    grid of cell_size cells, so only segments that share a cell are tested for intersection.
+    At each intersection, the original sample of each flight nearest to it is used to compare
+    variables. Crossover locations are accurate to about the simplification tolerance.
+
+    Parameters:
+        tracks (pd.DataFrame): Points with 'x', 'y', 'flight' and the variable columns, in along-track
+            order within each flight (e.g. from load_snr_csv_tracks or snr_comparison.load_xopr_reflectivity)
+        variables (list of str): Columns to compare at each crossover (those missing from tracks are skipped)
+        tolerance (float): Track simplification tolerance
+        max_gap (float): Distance between consecutive points above which a track is broken
+        cell_size (float): Size of the grid cells used to index segments
+        max_sample_distance (float): Crossovers where either flight's nearest sample is further away than this are dropped
+        include_self_crossings (bool): If True, also report crossovers of a flight with itself
+
+    Returns:
+        pd.DataFrame: One row per crossover with its 'x' and 'y', 'flight_a', 'flight_b', the row
+        positions ('index_a', 'index_b') and distances ('distance_a', 'distance_b') of the samples
+        used, and for each variable v: v_a, v_b and v_diff (v_b - v_a)
+    """
+    variables = [v for v in variables if v in tracks.columns]
+    segments = track_segments(tracks, tolerance=tolerance, max_gap=max_gap)
+
+    a, b, cell_x, cell_y = _candidate_pairs(segments, cell_size)
+
+    # Drop pairs of a segment with its neighbors on the same track, and other-flight pairs if requested
+    same_flight = segments['flight'][a] == segments['flight'][b]
+    adjacent = (segments['end'][a] == segments['start'][b]) | (segments['end'][b] == segments['start'][a])
+    keep = ~(same_flight & adjacent)
+    if not include_self_crossings:
+        keep &= ~same_flight
+    a, b, cell_x, cell_y = a[keep], b[keep], cell_x[keep], cell_y[keep]
+
+    # Segment intersection: p + t r = q + u s, with t and u in [0, 1)
+    px, py = segments['x0'][a], segments['y0'][a]
+    rx, ry = segments['x1'][a] - px, segments['y1'][a] - py
+    qx, qy = segments['x0'][b], segments['y0'][b]
+    sx, sy = segments['x1'][b] - qx, segments['y1'][b] - qy
+    denom = rx * sy - ry * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = ((qx - px) * sy - (qy - py) * sx) / denom
+        u = ((qx - px) * ry - (qy - py) * rx) / denom
+    hit = (denom != 0) & (t >= 0) & (t < 1) & (u >= 0) & (u < 1)
+
+    ix, iy = px + t * rx, py + t * ry
+    # Each pair is found once per shared cell, so keep only the copy in the cell containing the intersection
+    with np.errstate(invalid='ignore'):
+        hit &= (np.floor(ix / cell_size) == cell_x) & (np.floor(iy / cell_size) == cell_y)
+
+    a, b, ix, iy = a[hit], b[hit], ix[hit], iy[hit]
+
+    x = tracks['x'].to_numpy(dtype=np.float64)
+    y = tracks['y'].to_numpy(dtype=np.float64)
+    index_a, distance_a = _nearest_sample(x, y, segments['start'][a], segments['end'][a], ix, iy)
+    index_b, distance_b = _nearest_sample(x, y, segments['start'][b], segments['end'][b], ix, iy)
+
+    crossovers = pd.DataFrame({
+        'x': ix, 'y': iy,
+        'flight_a': segments['flight_names'][segments['flight'][a]],
+        'flight_b': segments['flight_names'][segments['flight'][b]],
+        'index_a': index_a, 'index_b': index_b,
+        'distance_a': distance_a, 'distance_b': distance_b,
+    })
+    for v in variables:
+        values = tracks[v].to_numpy()
+        crossovers[f'{v}_a'] = values[index_a]
+        crossovers[f'{v}_b'] = values[index_b]
+        crossovers[f'{v}_diff'] = crossovers[f'{v}_b'] - crossovers[f'{v}_a']
+
+    close = (crossovers['distance_a'] <= max_sample_distance) & (crossovers['distance_b'] <= max_sample_distance)
+    return crossovers[close].reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find flight line crossovers and compare surface/bed power and SNR at each.")
+    parser.add_argument('--input', type=str, action='append', required=True,
+                        help="SNR CSV file from raw_to_snr.py, or a directory of xOPR reflectivity zarr stores. May be repeated")
+    parser.add_argument('--crs', type=str, default='EPSG:3031', help="Projected CRS for xOPR reflectivity stores")
+    parser.add_argument('--tolerance', type=float, default=50, help="Track simplification tolerance, in meters")
+    parser.add_argument('--cell-size', type=float, default=10_000, help="Size of the spatial index grid cells, in meters")
+    parser.add_argument('--max-sample-distance', type=float, default=500, help="Maximum distance from a crossover to the samples compared at it, in meters")
+    parser.add_argument('--output', type=str, default='crossovers.parquet', help="Output Parquet file")
+    args = parser.parse_args()
+
+    tracks = pd.concat([
+        load_snr_csv_tracks(path) if path.endswith('.csv') else load_xopr_reflectivity(path, crs=args.crs)
+        for path in args.input
+    ], ignore_index=True)
+    print(f"Loaded {len(tracks)} points from {tracks['flight'].nunique()} flights")
+
+    crossovers = find_crossovers(tracks, tolerance=args.tolerance, cell_size=args.cell_size,
+                                 max_sample_distance=args.max_sample_distance)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    crossovers.to_parquet(args.output, index=False)
+    print(f"Found {len(crossovers)} crossovers, saved to {args.output}")
+
+    for v in CROSSOVER_VARIABLES:
+        if f'{v}_diff' in crossovers:
+            diff = crossovers[f'{v}_diff']
+            print(f"{v}: mean difference {diff.mean():.2f}, RMS {np.sqrt(np.mean(diff**2)):.2f}")
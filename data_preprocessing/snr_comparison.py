@@ -0,0 +1,245 @@
+import glob
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.constants
+from scipy.spatial import cKDTree
+
+def load_snr_csv(path, snr_column='snr', negate_snr=False, extra_columns=None):
+    """
+    Load the x, y and SNR columns of an SNR CSV file (e.g. from raw_to_snr.py or the UTIG snr.csv).
+
+    Only the needed columns are parsed, with SNR stored as float32, so full un-decimated
+    datasets fit in memory.
+
+    Parameters:
+        path (str): Path to the CSV file
+        snr_column (str): Name of the SNR column
+        negate_snr (bool): If True, multiply SNR by -1 (the UTIG dataset uses the opposite sign convention)
+        extra_columns (list of str): Additional columns to keep (e.g. 'source_dir')
+
+    Returns:
+        pd.DataFrame: Columns 'x', 'y', 'snr' and any extra columns
+    """
+    extra_columns = list(extra_columns or [])
+    df = pd.read_csv(path, usecols=['x', 'y', snr_column] + extra_columns,
+                     dtype={'x': np.float64, 'y': np.float64, snr_column: np.float32})
+    df = df.rename(columns={snr_column: 'snr'})
+    if negate_snr:
+        df['snr'] = -df['snr']
+    return df.dropna(subset=['x', 'y', 'snr']).reset_index(drop=True)
+
+def load_xopr_reflectivity(path, crs='EPSG:3031', ice_relative_permittivity=3.17):
+    """
+    Load RSSNR from the per-flight reflectivity zarr stores written by data_preprocessing_xopr.
+
+    RSSNR is computed from the repicked surface and bed power with the same geometric spreading
+    correction as 1_Plot_Reflectivity_Results.ipynb, and positions are projected to crs.
+
+    Parameters:
+        path (str): Directory containing reflectivity_*.zarr stores, or a glob pattern matching them
+        crs (str): Projected CRS of the output x and y coordinates
+        ice_relative_permittivity (float): Relative permittivity of ice used to convert TWTT to thickness
+
+    Returns:
+        pd.DataFrame: Columns 'x', 'y', 'snr', 'surface_power_dB', 'bed_power_dB' and 'flight'
+        (the name of the source zarr store), in along-track order within each flight
+    """
+    import pyproj
+    import xarray as xr
+
+    paths = sorted(glob.glob(os.path.join(path, '*.zarr') if os.path.isdir(path) else path))
+    if not paths:
+        raise FileNotFoundError(f"No zarr stores found at {path}")
+
+    transformer = pyproj.Transformer.from_crs('EPSG:4326', crs, always_xy=True)
+    n = np.sqrt(ice_relative_permittivity)
+    speed_in_ice = scipy.constants.c / n
+
+    dfs = []
+    for p in paths:
+        with xr.open_zarr(p) as ds:
+            ds = ds[['surface_twtt', 'bed_twtt', 'surface_power_dB', 'bed_power_dB', 'Latitude', 'Longitude']].load()
+
+        h = ds['surface_twtt'].values * scipy.constants.c / 2
+        z = (ds['bed_twtt'].values - ds['surface_twtt'].values) * speed_in_ice / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            geom_spreading_surf_dB = 10 * np.log10(1 / h**2)
+            geom_spreading_bed_dB = 10 * np.log10(1 / (h + z / n)**2)
+        snr = ((ds['surface_power_dB'].values - geom_spreading_surf_dB)
+               - (ds['bed_power_dB'].values - geom_spreading_bed_dB))
+
+        x, y = transformer.transform(ds['Longitude'].values, ds['Latitude'].values)
+        dfs.append(pd.DataFrame({
+            'x': x, 'y': y, 'snr': snr.astype(np.float32),
+            'surface_power_dB': ds['surface_power_dB'].values.astype(np.float32),
+            'bed_power_dB': ds['bed_power_dB'].values.astype(np.float32),
+            'flight': os.path.basename(p),
+        }))
+
+    df = pd.concat(dfs, ignore_index=True)
+    return df[np.isfinite(df['snr']) & np.isfinite(df['x']) & np.isfinite(df['y'])].reset_index(drop=True)
+
+def load_snr_dataset(path, negate_snr=False, crs='EPSG:3031'):
+    """
+    Load an SNR dataset, choosing the loader from the path: CSV files use load_snr_csv and
+    anything else is treated as xOPR reflectivity zarr stores (load_xopr_reflectivity).
+
+    Returns:
+        pd.DataFrame: Columns 'x', 'y' and 'snr'
+    """
+    if path.endswith('.csv'):
+        return load_snr_csv(path, negate_snr=negate_snr)
+    df = load_xopr_reflectivity(path, crs=crs)
+    if negate_snr:
+        df['snr'] = -df['snr']
+    return df
+
+def match_points(reference, other, max_distance=5000, chunk_size=1_000_000, workers=-1):
+    """
+    Match each reference point to the nearest other point within max_distance.
+
+    The tree is built on other, and reference points are queried chunk_size at a time, each
+    chunk split across workers threads. Points outside the bounding box of other (expanded by
+    max_distance) are skipped without querying.
+
+    Parameters:
+        reference (pd.DataFrame): Points to match, with 'x' and 'y' columns
+        other (pd.DataFrame): Candidate points, with 'x' and 'y' columns
+        max_distance (float): Maximum matching distance (in the units of x and y)
+        chunk_size (int): Number of reference points to query at a time
+        workers (int): Number of threads used by each query (-1 uses all cores)
+
+    Returns:
+        (reference_idx, other_idx, distance): Positional indices of matched pairs and their distances
+    """
+    empty = (np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float64))
+    if len(reference) == 0 or len(other) == 0:
+        return empty
+
+    other_xy = other[['x', 'y']].to_numpy(dtype=np.float64)
+    lower, upper = other_xy.min(axis=0) - max_distance, other_xy.max(axis=0) + max_distance
+
+    reference_xy = reference[['x', 'y']].to_numpy(dtype=np.float64)
+    candidates = np.flatnonzero(np.all((reference_xy >= lower) & (reference_xy <= upper), axis=1))
+    if len(candidates) == 0:
+        return empty
+
+    tree = cKDTree(other_xy)
+
+    reference_idx, other_idx, distance = [], [], []
+    for start in range(0, len(candidates), chunk_size):
+        chunk = candidates[start:start + chunk_size]
+        d, i = tree.query(reference_xy[chunk], k=1, distance_upper_bound=max_distance, workers=workers)
+        valid = i < tree.n
+        reference_idx.append(chunk[valid])
+        other_idx.append(i[valid])
+        distance.append(d[valid])
+
+    return np.concatenate(reference_idx), np.concatenate(other_idx), np.concatenate(distance)
+
+def summarize_pairs(pairs, name_a, name_b, region_size=100_000):
+    """
+    Summary statistics of the SNR difference (b - a) of matched pairs, overall and per region.
+
+    Regions are square tiles of region_size, identified by the tile indices of the reference point.
+
+    Returns:
+        pd.DataFrame: One row per region ('all' first) with the count, bias (mean difference),
+        RMS and standard deviation of the difference, the correlation of the two SNRs, and the
+        center of the region tile
+    """
+    diff = (pairs[f'snr_{name_b}'].astype(np.float64) - pairs[f'snr_{name_a}'].astype(np.float64)).to_numpy()
+    tile_x = np.floor(pairs[f'x_{name_a}'].to_numpy() / region_size).astype(np.int64)
+    tile_y = np.floor(pairs[f'y_{name_a}'].to_numpy() / region_size).astype(np.int64)
+
+    df = pd.DataFrame({
+        'tile_x': tile_x, 'tile_y': tile_y,
+        'diff': diff, 'diff_sq': diff**2,
+        'a': pairs[f'snr_{name_a}'].astype(np.float64).to_numpy(),
+        'b': pairs[f'snr_{name_b}'].astype(np.float64).to_numpy(),
+    })
+    df['ab'], df['aa'], df['bb'] = df['a'] * df['b'], df['a']**2, df['b']**2
+
+    sums = df.groupby(['tile_x', 'tile_y']).agg(
+        count=('diff', 'size'), diff=('diff', 'sum'), diff_sq=('diff_sq', 'sum'),
+        a=('a', 'sum'), b=('b', 'sum'), ab=('ab', 'sum'), aa=('aa', 'sum'), bb=('bb', 'sum')
+    ).reset_index()
+    sums['region'] = sums['tile_x'].astype(str) + '_' + sums['tile_y'].astype(str)
+    sums['region_x'] = (sums['tile_x'] + 0.5) * region_size
+    sums['region_y'] = (sums['tile_y'] + 0.5) * region_size
+
+    total = sums[['count', 'diff', 'diff_sq', 'a', 'b', 'ab', 'aa', 'bb']].sum().to_frame().T
+    total['region'] = 'all'
+    sums = pd.concat([total, sums.drop(columns=['tile_x', 'tile_y'])], ignore_index=True)
+
+    count = sums['count'].astype(np.float64)
+    bias = sums['diff'] / count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sums['ab'] / count - (sums['a'] / count) * (sums['b'] / count)
+        var_a = sums['aa'] / count - (sums['a'] / count)**2
+        var_b = sums['bb'] / count - (sums['b'] / count)**2
+        correlation = cov / np.sqrt(var_a * var_b)
+
+    return pd.DataFrame({
+        'dataset_a': name_a,
+        'dataset_b': name_b,
+        'region': sums['region'],
+        'region_x': sums['region_x'],
+        'region_y': sums['region_y'],
+        'count': sums['count'].astype(np.int64),
+        'bias': bias,
+        'rms': np.sqrt(sums['diff_sq'] / count),
+        'std': np.sqrt(np.maximum(sums['diff_sq'] / count - bias**2, 0)),
+        'correlation': correlation,
+    })
+
+def compare_snr_datasets(datasets, output_dir, max_distance=5000, region_size=100_000, chunk_size=1_000_000, workers=-1):
+    """
+    Match every pair of SNR datasets and write the matched pairs and summary statistics as Parquet.
+
+    For each pair (a, b), in the order given, each point of a is matched to the nearest point of
+    b within max_distance (see match_points). The pairs are written to
+    {output_dir}/pairs_{a}__{b}.parquet with columns x_{name}, y_{name}, snr_{name} for both
+    datasets plus 'distance'. The statistics of every pair are written together to
+    {output_dir}/summary.parquet (see summarize_pairs).
+
+    Parameters:
+        datasets (dict): Dataset name -> DataFrame with 'x', 'y' and 'snr' columns (in the same CRS)
+        output_dir (str): Directory to write to (created if needed)
+        max_distance (float): Maximum matching distance
+        region_size (float): Size of the square region tiles used for the per-region statistics
+        chunk_size (int): Number of points to query at a time
+        workers (int): Number of threads used by each query (-1 uses all cores)
+
+    Returns:
+        pd.DataFrame: The summary statistics
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    summaries = []
+    for name_a, name_b in itertools.combinations(datasets, 2):
+        a, b = datasets[name_a], datasets[name_b]
+        idx_a, idx_b, distance = match_points(a, b, max_distance=max_distance, chunk_size=chunk_size, workers=workers)
+        print(f"{name_a} vs {name_b}: {len(idx_a)} matched points")
+
+        pairs = pd.DataFrame({
+            f'x_{name_a}': a['x'].to_numpy()[idx_a],
+            f'y_{name_a}': a['y'].to_numpy()[idx_a],
+            f'snr_{name_a}': a['snr'].to_numpy()[idx_a],
+            f'x_{name_b}': b['x'].to_numpy()[idx_b],
+            f'y_{name_b}': b['y'].to_numpy()[idx_b],
+            f'snr_{name_b}': b['snr'].to_numpy()[idx_b],
+            'distance': distance.astype(np.float32),
+        })
+        pairs.to_parquet(os.path.join(output_dir, f'pairs_{name_a}__{name_b}.parquet'), index=False)
+
+        if len(pairs) > 0:
+            summaries.append(summarize_pairs(pairs, name_a, name_b, region_size=region_size))
+
+    summary = pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame(
+        columns=['dataset_a', 'dataset_b', 'region', 'region_x', 'region_y', 'count', 'bias', 'rms', 'std', 'correlation'])
+    summary.to_parquet(os.path.join(output_dir, 'summary.parquet'), index=False)
+    return summary
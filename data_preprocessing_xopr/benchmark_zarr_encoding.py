@@ -0,0 +1,111 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from zarr_encoding import ENCODING_PROFILES, write_reflectivity_zarr
+
+def synthetic_reflectivity_dataset(n_traces=36_000, seed=0):
+    """
+    A reflectivity dataset with the variables and types written by process_radar_line:
+    float64 picks and powers, the number of stacked traces, and a set of per-trace metadata
+    variables, at 1 s spacing.
+    """
+    rng = np.random.default_rng(seed)
+    slow_time = pd.date_range('2016-10-26', periods=n_traces, freq='1s')
+    t = np.arange(n_traces)
+
+    surface_twtt = 1e-5 + 1e-7 * np.cumsum(rng.normal(size=n_traces))
+    data_vars = {
+        'surface_twtt': surface_twtt,
+        'bed_twtt': surface_twtt + 2e-5 + 1e-7 * np.cumsum(rng.normal(size=n_traces)),
+        'surface_power_dB': -40 + 3 * rng.normal(size=n_traces),
+        'bed_power_dB': -90 + 5 * rng.normal(size=n_traces),
+        'Latitude': -80 + 1e-4 * t,
+        'Longitude': 120 + 2e-4 * t,
+        'Elevation': 8000 + np.cumsum(rng.normal(size=n_traces)),
+        'GPS_time': 1.47e9 + t.astype(np.float64),
+        'Heading': np.cumsum(1e-3 * rng.normal(size=n_traces)),
+        'Pitch': 1e-2 * rng.normal(size=n_traces),
+        'Roll': 1e-2 * rng.normal(size=n_traces),
+        'n_traces': rng.integers(18, 22, size=n_traces),
+    }
+    ds = xr.Dataset({k: ('slow_time', v) for k, v in data_vars.items()}, coords={'slow_time': slow_time})
+    ds['bed_power_dB'][rng.random(n_traces) < 0.05] = np.nan  # Missing bed picks
+    return ds
+
+def store_size(path):
+    return sum(os.path.getsize(os.path.join(dp, f)) for dp, _, filenames in os.walk(path) for f in filenames)
+
+def benchmark_profiles(ds, profiles=None, n_stores=20, work_dir=None):
+    """
+    Write n_stores copies of ds with each encoding profile, then open all of them and read the variables.
+
+    Returns:
+        pd.DataFrame: One row per profile with the write and read throughput (stores per second and
+        MB of in-memory data per second), the size on disk of one store, and the maximum error of the
+        stored powers and picks
+    """
+    profiles = profiles or list(ENCODING_PROFILES)
+    work_dir = tempfile.mkdtemp(dir=work_dir)
+    in_memory_mb = ds.nbytes / 1e6
+
+    rows = []
+    try:
+        for profile in profiles:
+            paths = [os.path.join(work_dir, f"{profile}_{i}.zarr") for i in range(n_stores)]
+
+            start = time.perf_counter()
+            for p in paths:
+                write_reflectivity_zarr(ds, p, profile=profile)
+            write_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for p in paths:
+                with xr.open_zarr(p) as stored:
+                    stored = stored.load()
+            read_s = time.perf_counter() - start
+
+            max_error = {
+                v: float(np.nanmax(np.abs(stored[v].values.astype(np.float64) - ds[v].values)))
+                for v in ('surface_power_dB', 'bed_power_dB', 'surface_twtt', 'bed_twtt')
+            }
+
+            rows.append({
+                'profile': profile,
+                'write_stores_per_s': n_stores / write_s,
+                'write_MB_per_s': n_stores * in_memory_mb / write_s,
+                'read_stores_per_s': n_stores / read_s,
+                'read_MB_per_s': n_stores * in_memory_mb / read_s,
+                'store_size_MB': store_size(paths[0]) / 1e6,
+                'n_variables': len(stored.data_vars),
+                'max_error_power_dB': max(max_error['surface_power_dB'], max_error['bed_power_dB']),
+                'max_error_twtt_s': max(max_error['surface_twtt'], max_error['bed_twtt']),
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return pd.DataFrame(rows).set_index('profile')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark write/read throughput and size of reflectivity zarr encoding profiles.")
+    parser.add_argument('--input', type=str, default=None, help="Existing reflectivity zarr store to benchmark with. Default: a synthetic 10 hour flight")
+    parser.add_argument('--n-traces', type=int, default=36_000, help="Number of traces in the synthetic flight")
+    parser.add_argument('--n-stores', type=int, default=20, help="Number of stores to write and read per profile")
+    parser.add_argument('--profiles', type=str, nargs='*', default=None, help=f"Profiles to benchmark. Default: all of {list(ENCODING_PROFILES)}")
+    parser.add_argument('--work-dir', type=str, default=None, help="Directory for temporary stores. Default: the system temporary directory")
+    args = parser.parse_args()
+
+    if args.input:
+        ds = xr.open_zarr(args.input).load()
+    else:
+        ds = synthetic_reflectivity_dataset(args.n_traces)
+
+    results = benchmark_profiles(ds, profiles=args.profiles, n_stores=args.n_stores, work_dir=args.work_dir)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(results)
@@ -0,0 +1,233 @@
+import datetime
+import json
+import os
+import time
+import traceback
+import warnings
+
+import dask.distributed
+import fsspec
+import psutil
+
+CRESIS_DATA_URL = 'https://data.cresis.ku.edu/data/rds'
+
+# Heuristics for the cost model. A CSARP_standard frame is typically a few hundred MB on disk,
+# and the peak memory of processing a flight is a few times the size of its concatenated frames
+# (the concatenated flight, the stacked copy and the power/where temporaries in extract_layer_peak_power).
+DEFAULT_FRAME_BYTES = 200e6
+MEMORY_PER_INPUT_BYTE = 3.0
+BASE_MEMORY_BYTES = 1e9
+
+def list_flight_frames(flight_id : str, season_name : str, data_product : str = 'CSARP_standard',
+                       base_url : str = CRESIS_DATA_URL):
+    """
+    List the frame files of a flight and their sizes.
+
+    Parameters:
+    - flight_id: The ID of the flight (e.g., '20161026_05').
+    - season_name: Name of the season (e.g., '2016_Antarctica_DC8').
+    - data_product: Name of the data product directory.
+    - base_url: Root of the data archive, parsed by fsspec.
+
+    Returns:
+    - A dictionary of frame URL -> size in bytes (None if the server does not report sizes).
+    """
+    flight_url = f"{base_url}/{season_name}/{data_product}/{flight_id}/"
+    fs = fsspec.filesystem(fsspec.utils.infer_storage_options(flight_url)['protocol'])
+    listing = fs.ls(flight_url, detail=True)
+    return {
+        entry['name']: entry.get('size')
+        for entry in listing
+        if os.path.basename(entry['name'].rstrip('/')).startswith(f"Data_{flight_id}_")
+    }
+
+def estimate_flight_cost(flight_id : str, season_name : str, n_frames : int = None, frame_sizes : dict = None,
+                         default_frame_bytes : float = DEFAULT_FRAME_BYTES,
+                         memory_per_input_byte : float = MEMORY_PER_INPUT_BYTE,
+                         base_memory_bytes : float = BASE_MEMORY_BYTES):
+    """
+    Estimate the input size and peak memory needed to process a flight.
+
+    If neither n_frames nor frame_sizes is given, the flight's frames are listed with
+    list_flight_frames. Frames with an unknown size are assumed to be default_frame_bytes.
+
+    Parameters:
+    - flight_id: The ID of the flight (e.g., '20161026_05').
+    - season_name: Name of the season (e.g., '2016_Antarctica_DC8').
+    - n_frames: Number of frames in the flight, if known.
+    - frame_sizes: Dictionary of frame URL -> size in bytes (or None), if known.
+    - default_frame_bytes: Assumed size of a frame whose size is unknown.
+    - memory_per_input_byte: Peak memory per byte of input data.
+    - base_memory_bytes: Fixed memory overhead of processing any flight.
+
+    Returns:
+    - A dictionary with 'flight_id', 'season_name', 'n_frames', 'input_bytes' and 'memory_bytes'.
+    """
+    if n_frames is None and frame_sizes is None:
+        try:
+            frame_sizes = list_flight_frames(flight_id, season_name)
+        except Exception as e:
+            warnings.warn(f"Could not list frames of {season_name} {flight_id} ({e}). Assuming a single frame.")
+            frame_sizes = {}
+
+    if frame_sizes:
+        n_frames = len(frame_sizes)
+        input_bytes = sum(default_frame_bytes if s is None else s for s in frame_sizes.values())
+    else:
+        n_frames = max(n_frames or 1, 1)
+        input_bytes = n_frames * default_frame_bytes
+
+    return {
+        'flight_id': flight_id,
+        'season_name': season_name,
+        'n_frames': int(n_frames),
+        'input_bytes': int(input_bytes),
+        'memory_bytes': int(base_memory_bytes + memory_per_input_byte * input_bytes),
+    }
+
+def memory_aware_cluster(n_workers : int = None, threads_per_worker : int = 1, memory_limit : float = None, **kwargs):
+    """
+    Start a LocalCluster whose workers advertise a 'MEMORY' resource equal to their memory limit,
+    so that tasks submitted by run_flights with a memory estimate are only packed onto a worker
+    while they fit.
+
+    Parameters:
+    - n_workers: Number of worker processes. Defaults to the number of cores / threads_per_worker.
+    - threads_per_worker: Number of threads per worker.
+    - memory_limit: Memory limit of each worker in bytes. Defaults to the total system memory / n_workers.
+    - kwargs: Passed to dask.distributed.LocalCluster.
+
+    Returns:
+    - A dask.distributed.LocalCluster.
+    """
+    if n_workers is None:
+        n_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    if memory_limit is None:
+        memory_limit = psutil.virtual_memory().total / n_workers
+
+    return dask.distributed.LocalCluster(n_workers=n_workers, threads_per_worker=threads_per_worker,
+                                         memory_limit=int(memory_limit), resources={'MEMORY': int(memory_limit)},
+                                         **kwargs)
+
+def read_run_log(run_log_path : str):
+    """
+    Read a run log written by run_flights.
+
+    Parameters:
+    - run_log_path: Path to the run log, parsed by fsspec.
+
+    Returns:
+    - A list of log records (dictionaries), one per attempt, oldest first.
+    """
+    with fsspec.open(run_log_path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def run_flights(client, flights : list, process_function, run_log_path : str,
+                max_retries : int = 2, retry_backoff_s : float = 30, retry_backoff_factor : float = 2, **kwargs):
+    """
+    Process flights on a dask cluster, largest first, with per-task memory resources and retries.
+
+    Each flight is submitted as process_function(flight_id, season_name=season_name, **kwargs).
+    Flights are submitted in order of decreasing estimated memory with a matching priority, so the
+    longest tasks start first and small flights fill in around them. If the cluster's workers
+    advertise a 'MEMORY' resource (see memory_aware_cluster), each task declares its memory
+    estimate (capped at the largest worker), so large flights are not packed onto the same worker.
+
+    A failed flight is resubmitted after retry_backoff_s seconds, multiplied by retry_backoff_factor
+    for each further attempt, up to max_retries times. Every attempt is appended to the run log as
+    one JSON line, so outcomes survive the session and can be inspected with read_run_log.
+
+    Parameters:
+    - client: dask.distributed.Client.
+    - flights: List of flight cost dictionaries from estimate_flight_cost.
+    - process_function: Function to run for each flight, e.g. radar_line_processing.process_radar_line.
+    - run_log_path: Path of the run log (JSON lines, appended to), parsed by fsspec.
+    - max_retries: Number of times to retry a failed flight.
+    - retry_backoff_s: Delay before the first retry, in seconds.
+    - retry_backoff_factor: Multiplier of the delay for each further retry.
+    - kwargs: Passed to process_function.
+
+    Returns:
+    - A dictionary of (season_name, flight_id) -> final log record of that flight.
+    """
+    flights = sorted(flights, key=lambda f: f['memory_bytes'], reverse=True)
+
+    worker_memory = [w.get('resources', {}).get('MEMORY') for w in client.scheduler_info()['workers'].values()]
+    max_worker_memory = max(worker_memory) if worker_memory and all(m is not None for m in worker_memory) else None
+    if max_worker_memory is not None:
+        too_large = [f['flight_id'] for f in flights if f['memory_bytes'] > max_worker_memory]
+        if too_large:
+            warnings.warn(f"Flights {too_large} are estimated to need more memory than any worker has. "
+                          "They will run alone on a worker.")
+
+    def submit(flight, attempt):
+        submit_kwargs = {'priority': flight['memory_bytes'], 'pure': False,
+                         'key': f"{flight['season_name']}_{flight['flight_id']}_attempt{attempt}"}
+        if max_worker_memory is not None:
+            submit_kwargs['resources'] = {'MEMORY': min(flight['memory_bytes'], max_worker_memory)}
+        future = client.submit(process_function, flight['flight_id'], season_name=flight['season_name'],
+                               **kwargs, **submit_kwargs)
+        running[future] = (flight, attempt, time.monotonic())
+
+    def log(record):
+        with fsspec.open(run_log_path, 'a') as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    if os.path.dirname(run_log_path):
+        fsspec.filesystem(fsspec.utils.infer_storage_options(run_log_path)['protocol']).makedirs(
+            os.path.dirname(run_log_path), exist_ok=True)
+
+    running = {}
+    waiting = [] # (time at which to resubmit, flight, attempt)
+    outcomes = {}
+    for flight in flights:
+        submit(flight, 0)
+
+    while running or waiting:
+        now = time.monotonic()
+        for item in [w for w in waiting if w[0] <= now]:
+            waiting.remove(item)
+            submit(item[1], item[2])
+
+        if not running:
+            time.sleep(max(0, min(w[0] for w in waiting) - now))
+            continue
+
+        timeout = max(0.1, min(w[0] for w in waiting) - now) if waiting else None
+        try:
+            done, _ = dask.distributed.wait(list(running), timeout=timeout, return_when='FIRST_COMPLETED')
+        except TimeoutError:
+            continue
+
+        for future in done:
+            flight, attempt, start = running.pop(future)
+            record = {
+                'time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'season_name': flight['season_name'],
+                'flight_id': flight['flight_id'],
+                'attempt': attempt,
+                'duration_s': round(time.monotonic() - start, 1),
+                'n_frames': flight['n_frames'],
+                'estimated_memory_bytes': flight['memory_bytes'],
+            }
+            try:
+                result = future.result()
+                record['result'] = result if isinstance(result, (str, int, float, type(None))) else type(result).__name__
+                record['status'] = 'success'
+            except Exception as e:
+                record['error'] = repr(e)
+                record['traceback'] = traceback.format_exc()
+                if attempt < max_retries:
+                    delay = retry_backoff_s * retry_backoff_factor ** attempt
+                    record['status'] = 'retrying'
+                    waiting.append((time.monotonic() + delay, flight, attempt + 1))
+                    print(f"Error processing {flight['season_name']} {flight['flight_id']} (attempt {attempt + 1}): {e}. Retrying in {delay:.0f} s")
+                else:
+                    record['status'] = 'error'
+                    print(f"Error processing {flight['season_name']} {flight['flight_id']}: {e}. Giving up after {attempt + 1} attempts")
+            future.release()
+
+            log(record)
+            outcomes[(flight['season_name'], flight['flight_id'])] = record
+
+    return outcomes
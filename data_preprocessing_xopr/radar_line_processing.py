@@ -12,6 +12,9 @@ import os
 import zarr
 import fsspec
 
+from stacking import stack_fixed_interval
+from zarr_encoding import write_reflectivity_zarr
+
 def get_output_locations(flight_id : str, season_name : str, output_storage_location : str):
     """
     Build the output paths for processed radar line data
@@ -217,6 +220,8 @@ def process_radar_line(flight_id : list, season_name : str, output_storage_locat
             'layer_selection_margin_m': 30,  # meters
             'ice_relative_permittivity': 3.17,  # Relative permittivity of ice
             'downsample_interval_s': 1,  # Rolling window for downsampling, in seconds
+            'stacking_mode': 'incoherent',  # How traces are stacked, see stacking.STACKING_MODES
+            'encoding_profile': 'compact',  # Output encoding, see zarr_encoding.ENCODING_PROFILES
          }
     - save_summary_image: Boolean indicating whether to save a summary image of the processed radar line.
     - return_dataset: Boolean indicating whether to return the processed dataset.
@@ -232,6 +237,8 @@ def process_radar_line(flight_id : list, season_name : str, output_storage_locat
         'layer_selection_margin_m': 30,  # meters
         'ice_relative_permittivity': 3.17,  # Relative permittivity of ice
         'downsample_interval_s': 1,  # Rolling window for downsampling, in seconds
+        'stacking_mode': 'incoherent',  # How traces are stacked, see stacking.STACKING_MODES
+        'encoding_profile': 'compact',  # Output encoding, see zarr_encoding.ENCODING_PROFILES
     }
 
     # Update default parameters with any user-provided parameters
@@ -252,8 +259,9 @@ def process_radar_line(flight_id : list, season_name : str, output_storage_locat
     frames = opr.load_flight(season_name, flight_id=flight_id)
     flight_line = xr.concat(frames, dim='slow_time', combine_attrs='drop_conflicts')
 
-    # Downsample by stacking to 1 second intervals
-    flight_line = flight_line.resample(slow_time=f"{parameters['downsample_interval_s']}s").mean()
+    # Downsample by stacking to 1 second intervals (with the number of stacked traces in 'n_traces')
+    flight_line = stack_fixed_interval(flight_line, interval_s=parameters['downsample_interval_s'],
+                                       mode=parameters['stacking_mode'])
 
     # Fetch layer data from OPS
     layers = None
@@ -295,7 +303,7 @@ def process_radar_line(flight_id : list, season_name : str, output_storage_locat
     if 'cache_revision_id' in parameters:
         reflectivity_dataset.attrs['revision_id'] = parameters['cache_revision_id']
 
-    reflectivity_dataset.to_zarr(output_paths['zarr'], mode='w')
+    write_reflectivity_zarr(reflectivity_dataset, output_paths['zarr'], profile=parameters['encoding_profile'])
 
     if save_summary_image:
         save_radar_summary_image(flight_line, reflectivity_dataset, layers, output_paths['summary_image'])
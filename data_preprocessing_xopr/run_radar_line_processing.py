@@ -1,19 +1,17 @@
-import dask
-from dask.distributed import LocalCluster
-from dask.distributed import as_completed
-import traceback
 from radar_line_processing import process_radar_line
+from flight_scheduling import memory_aware_cluster, estimate_flight_cost, run_flights
 
 
 if __name__ == "__main__":
 
-    client = LocalCluster().get_client()
+    client = memory_aware_cluster().get_client()
 
-    flight_line_urls = [
-        [f'https://data.cresis.ku.edu/data/rds/2016_Antarctica_DC8/CSARP_standard/20161026_05/Data_20161026_05_{i:03d}.mat' for i in range(1, 43)], #range(1, 43)
-        [f'https://data.cresis.ku.edu/data/rds/2016_Antarctica_DC8/CSARP_standard/20161028_04/Data_20161028_04_{i:03d}.mat' for i in range(1, 35)], #range(1, 35)
-        [f'https://data.cresis.ku.edu/data/rds/2016_Antarctica_DC8/CSARP_standard/20161028_05/Data_20161028_05_{i:03d}.mat' for i in range(1, 11)], #range(1, 11)
-    ]
+    season_name = '2016_Antarctica_DC8'
+    flight_frame_counts = {
+        '20161026_05': 42,
+        '20161028_04': 34,
+        '20161028_05': 10,
+    }
 
     output_storage_location = "tmp"
 
@@ -24,18 +22,17 @@ if __name__ == "__main__":
             'ice_relative_permittivity': 3.17,  # Relative permittivity of ice
             'downsample_interval_s': 1,  # Rolling window for downsampling, in seconds
         },
+        'return_dataset': False,
     }
 
-    futures = client.map(
-        process_radar_line,
-        flight_line_urls,
-        **kwargs)
-
-    # Process results as they complete, capturing exceptions
-    results = []
-    for future in as_completed(futures):
-        try:
-            result = future.result()
-            results.append(('success', result))
-        except Exception as e:
-            results.append(('error', e, traceback.format_exc()))
+    flights = [estimate_flight_cost(flight_id, season_name, n_frames=n_frames)
+               for flight_id, n_frames in flight_frame_counts.items()]
+
+    # Largest flights first, each declaring its estimated memory, with failed flights retried.
+    # Every attempt is appended to the run log.
+    outcomes = run_flights(client, flights, process_radar_line,
+                           run_log_path=f"{output_storage_location}/run_log.jsonl",
+                           **kwargs)
+
+    for (season, flight_id), record in outcomes.items():
+        print(f"{season} {flight_id}: {record['status']} after {record['attempt'] + 1} attempt(s)")
@@ -0,0 +1,122 @@
+import warnings
+
+import numpy as np
+import zarr
+
+# Encoding profiles for the per-flight reflectivity zarr stores.
+# - float_dtype: Storage type of floating point variables (None keeps the in-memory type)
+# - quantize_dB: If set, variables whose name ends in '_dB' are stored as int16 with this step (in dB)
+# - chunk_size: Number of traces per chunk along slow_time. Stores are read a whole flight line at a
+#   time, so chunks are large.
+# - compressor: (cname, clevel) of a Blosc compressor, or None for the zarr default
+# - metadata_variables: Per-trace metadata variables to keep, or None to keep all of them
+# - consolidated: Write consolidated metadata, so a store can be opened with a single read
+ENCODING_PROFILES = {
+    # What process_radar_line wrote before encoding profiles existed
+    'default': {
+        'float_dtype': None,
+        'quantize_dB': None,
+        'chunk_size': None,
+        'compressor': None,
+        'metadata_variables': None,
+        'consolidated': False,
+    },
+    # Same variables, stored as float32 with a stronger compressor
+    'float32': {
+        'float_dtype': 'float32',
+        'quantize_dB': None,
+        'chunk_size': 100_000,
+        'compressor': ('zstd', 5),
+        'metadata_variables': None,
+        'consolidated': True,
+    },
+    # Powers quantized to 0.01 dB and only the metadata needed downstream (including the
+    # number of traces stacked into each interval)
+    'compact': {
+        'float_dtype': 'float32',
+        'quantize_dB': 0.01,
+        'chunk_size': 100_000,
+        'compressor': ('zstd', 5),
+        'metadata_variables': ['Latitude', 'Longitude', 'Elevation', 'n_traces'],
+        'consolidated': True,
+    },
+}
+
+REFLECTIVITY_VARIABLES = ['surface_twtt', 'bed_twtt', 'surface_power_dB', 'bed_power_dB']
+
+def _compressor_encoding(cname, clevel, shuffle):
+    """
+    Encoding entry for a Blosc compressor, for either major version of zarr-python.
+    """
+    if int(zarr.__version__.split('.')[0]) >= 3:
+        shuffle = zarr.codecs.BloscShuffle.bitshuffle if shuffle == 'bit' else zarr.codecs.BloscShuffle.shuffle
+        return {'compressors': (zarr.codecs.BloscCodec(cname=cname, clevel=clevel, shuffle=shuffle),)}
+
+    import numcodecs
+    shuffle = numcodecs.Blosc.BITSHUFFLE if shuffle == 'bit' else numcodecs.Blosc.SHUFFLE
+    return {'compressor': numcodecs.Blosc(cname=cname, clevel=clevel, shuffle=shuffle)}
+
+def build_encoding(ds, profile='compact'):
+    """
+    Select the variables to store and build the zarr encoding for a reflectivity dataset.
+
+    Parameters:
+    - ds: xarray Dataset from process_radar_line.
+    - profile: Name of an entry of ENCODING_PROFILES, or a profile dictionary.
+
+    Returns:
+    - (ds, encoding): The dataset with only the variables to store, and the encoding to pass to to_zarr.
+    """
+    if isinstance(profile, str):
+        if profile not in ENCODING_PROFILES:
+            raise ValueError(f"Unknown encoding profile '{profile}'. Options are: {list(ENCODING_PROFILES)}")
+        profile = ENCODING_PROFILES[profile]
+
+    if profile['metadata_variables'] is not None:
+        keep = REFLECTIVITY_VARIABLES + list(profile['metadata_variables'])
+        ds = ds.drop_vars([v for v in ds.data_vars if v not in keep])
+
+    encoding = {}
+    for v in ds.variables:
+        var = ds[v]
+        enc = {}
+
+        if profile['chunk_size'] is not None and var.dims:
+            enc['chunks'] = tuple(min(profile['chunk_size'], s) if d == 'slow_time' else s for d, s in zip(var.dims, var.shape))
+
+        is_float = np.issubdtype(var.dtype, np.floating)
+        quantize = is_float and profile['quantize_dB'] is not None and v.endswith('_dB')
+        if quantize:
+            enc.update({'dtype': 'int16', 'scale_factor': profile['quantize_dB'], 'add_offset': 0.0, '_FillValue': np.iinfo(np.int16).min})
+        elif is_float and profile['float_dtype'] is not None:
+            enc['dtype'] = profile['float_dtype']
+
+        if profile['compressor'] is not None:
+            enc.update(_compressor_encoding(*profile['compressor'], shuffle='bit' if quantize else 'byte'))
+
+        if enc:
+            encoding[v] = enc
+
+    return ds, encoding
+
+def write_reflectivity_zarr(ds, path, profile='compact'):
+    """
+    Write a reflectivity dataset to a zarr store using an encoding profile.
+
+    Parameters:
+    - ds: xarray Dataset from process_radar_line.
+    - path: Path of the zarr store (overwritten if it exists), parsed by fsspec.
+    - profile: Name of an entry of ENCODING_PROFILES, or a profile dictionary.
+
+    Returns:
+    - The path to the zarr store.
+    """
+    consolidated = (ENCODING_PROFILES[profile] if isinstance(profile, str) else profile)['consolidated']
+    ds, encoding = build_encoding(ds, profile)
+
+    with warnings.catch_warnings():
+        # Consolidated metadata is not yet part of the zarr v3 spec, but zarr-python and xarray support it
+        warnings.filterwarnings('ignore', message='Consolidated metadata', category=UserWarning)
+        ds.to_zarr(path, mode='w', encoding=encoding, consolidated=consolidated)
+
+    return path
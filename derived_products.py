@@ -0,0 +1,213 @@
+'''
+Cache of the products derived from external datasets that every interpolation and gridding run needs:
+surface speed and speed error from the velocity mosaics, and the ERA5 2 m temperature ensemble mean
+and spread.
+
+Each product is computed once with Dask chunks and stored as a float32 zarr store under
+external_datasets/derived, with the sha256 of every source file recorded in its attributes. Later
+runs open the stored product, and only recompute it if a source file changed (or the product
+definition, tracked by its version, did).
+
+In the full workflow, each product is built by its own stage in pipeline.yaml, which the
+interpolation and gridding stages depend on. Builds also hold a lock on the product, so concurrent
+callers of load_derived_product wait for one build instead of writing the same store.
+
+Usage:
+    python derived_products.py                    # Build or refresh every product
+    python derived_products.py velocity_antarctica --force
+'''
+
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import warnings
+
+import numpy as np
+import xarray as xr
+
+from file_utils import FileHasher, file_lock
+
+DERIVED_DIR = 'external_datasets/derived'
+HASH_CACHE_FILENAME = 'file_hashes.json'
+
+def _antarctic_velocity(sources, chunk_size):
+    ds = xr.open_dataset(sources[0], chunks={'x': chunk_size, 'y': chunk_size})
+    # Calculate magnitude (speed) and error per NSIDC-0754 user guide:
+    # https://nsidc.org/sites/default/files/nsidc-0754-v001-userguide.pdf
+    return xr.Dataset({
+        'speed': np.sqrt(ds['VX']**2 + ds['VY']**2),
+        'speed_err': np.sqrt(ds['ERRX']**2 + ds['ERRY']**2),
+    }, attrs=ds.attrs)
+
+def _greenland_velocity(sources, chunk_size):
+    ds = xr.open_dataset(sources[0], chunks={'x': chunk_size, 'y': chunk_size})
+    # ITS_LIVE velocity data already has magnitude and magnitude error calculated, just need to re-name
+    return xr.Dataset({'speed': ds['v'], 'speed_err': ds['v_error']}, attrs=ds.attrs)
+
+def _era5_t2m_statistics(sources, chunk_size):
+    # The ensemble mean and spread are reduced one time step at a time
+    ds = xr.open_dataset(sources[0], chunks={'valid_time': 1})
+    t2m = ds['t2m'].mean(dim='valid_time')
+    return xr.Dataset({'t2m_mean': t2m.mean(dim='number'), 't2m_std': t2m.std(dim='number')})
+
+# Derived products.
+# - sources: Files the product is computed from. Their hashes decide whether the stored product is current.
+# - compute: Function (sources, chunk_size) -> lazy xr.Dataset of the product
+# - version: Increment when compute changes, so stored products are rebuilt
+DERIVED_PRODUCTS = {
+    'velocity_antarctica': {
+        'sources': ['external_datasets/antarctic_ice_vel_phase_map_v01.nc'],
+        'compute': _antarctic_velocity,
+        'version': 1,
+    },
+    'velocity_greenland': {
+        'sources': ['external_datasets/ITS_LIVE_velocity_120m_RGI05A_0000_v02.nc'],
+        'compute': _greenland_velocity,
+        'version': 1,
+    },
+    'era5_t2m_statistics': {
+        'sources': ['external_datasets/era5_t2m_ensemble.nc'],
+        'compute': _era5_t2m_statistics,
+        'version': 1,
+    },
+}
+
+def _open_store(path, chunks):
+    with warnings.catch_warnings():
+        # Consolidated metadata is not yet part of the zarr v3 spec, but zarr-python and xarray support it
+        warnings.filterwarnings('ignore', message='Consolidated metadata', category=UserWarning)
+        return xr.open_zarr(path, chunks=chunks)
+
+def _stored_provenance(path):
+    """
+    Provenance attributes of a stored product, or None if there is no readable product at path.
+    """
+    if not os.path.isdir(path):
+        return None
+    try:
+        with _open_store(path, chunks=None) as ds:
+            return {'version': ds.attrs.get('derived_product_version'), 'sources': ds.attrs.get('derived_product_sources')}
+    except (OSError, ValueError, KeyError):
+        return None
+
+def build_derived_product(name, path, source_hashes, chunk_size=2048):
+    """
+    Compute a derived product and write it to a zarr store as float32.
+
+    The store is written to a new temporary directory next to path and moved into place once
+    complete, so an interrupted build never leaves a store that looks current. Callers must hold
+    the product's lock (see load_derived_product).
+    """
+    product = DERIVED_PRODUCTS[name]
+    ds = product['compute'](product['sources'], chunk_size)
+
+    for v in ds.variables:
+        ds[v].encoding = {} # Source (NetCDF) encodings don't apply to the zarr store
+    ds.attrs = {
+        **ds.attrs,
+        'derived_product': name,
+        'derived_product_version': product['version'],
+        'derived_product_sources': source_hashes,
+        'derived_product_created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+
+    encoding = {}
+    for v in ds.data_vars:
+        ds[v] = ds[v].astype(np.float32)
+        if ds[v].chunks is not None:
+            # One zarr chunk per Dask chunk
+            encoding[v] = {'chunks': tuple(c[0] for c in ds[v].chunks)}
+
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=f'.{name}.')
+    try:
+        tmp_path = os.path.join(tmp_dir, os.path.basename(path))
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='Consolidated metadata', category=UserWarning)
+            ds.to_zarr(tmp_path, mode='w', encoding=encoding, consolidated=True)
+
+        # A directory can't replace a non-empty one, so move the old store aside first
+        if os.path.exists(path):
+            os.replace(path, os.path.join(tmp_dir, 'previous'))
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return path
+
+def load_derived_product(name, derived_dir=DERIVED_DIR, chunk_size=2048, force=False):
+    """
+    Open a derived product, computing (or recomputing) it first if the stored copy is missing or out of date.
+
+    The stored copy is current if it was built by the current version of the product from source
+    files with the same sha256 as the ones on disk. File hashes are cached by size and modification
+    time (in derived_dir/file_hashes.json), so checking an unchanged source does not re-read it.
+
+    Stores are opened under a shared lock and built under an exclusive one, so when several
+    processes need the same out of date product, one builds it and the others wait and open it.
+
+    Parameters:
+        name (str): Key of DERIVED_PRODUCTS
+        derived_dir (str): Directory of the stored products
+        chunk_size (int): Dask chunk size along x and y when computing gridded products, and of the returned dataset
+        force (bool): Recompute the product even if the stored copy is current
+
+    Returns:
+        xr.Dataset: The product, lazily loaded from its zarr store
+    """
+    if name not in DERIVED_PRODUCTS:
+        raise ValueError(f"Unknown derived product '{name}'. Options are: {list(DERIVED_PRODUCTS)}")
+    product = DERIVED_PRODUCTS[name]
+
+    os.makedirs(derived_dir, exist_ok=True)
+    hasher = FileHasher(os.path.join(derived_dir, HASH_CACHE_FILENAME))
+    source_hashes = {}
+    for source in product['sources']:
+        digest = hasher.digest(source)
+        if digest is None:
+            raise FileNotFoundError(f"Source file {source} of derived product '{name}' does not exist")
+        source_hashes[source] = digest
+    hasher.save()
+
+    path = os.path.join(derived_dir, f'{name}.zarr')
+    lock_path = path + '.lock'
+    current = {'version': product['version'], 'sources': source_hashes}
+
+    with file_lock(lock_path, shared=True):
+        stored = _stored_provenance(path)
+    if force or stored != current:
+        with file_lock(lock_path):
+            # Another process may have built it while we waited for the lock
+            stored = _stored_provenance(path)
+            if force or stored != current:
+                reason = 'forced' if force else ('missing' if stored is None else 'sources or version changed')
+                print(f"Building derived product '{name}' ({reason})", flush=True)
+                build_derived_product(name, path, source_hashes, chunk_size=chunk_size)
+
+    with file_lock(lock_path, shared=True):
+        ds = _open_store(path, chunks=None)
+    return ds.chunk({d: chunk_size for d in ('x', 'y') if d in ds.dims})
+
+def load_velocity(dataset, **kwargs):
+    """
+    Surface speed and speed error ('speed', 'speed_err') for 'antarctica' or 'greenland'.
+    """
+    return load_derived_product(f'velocity_{dataset}', **kwargs)
+
+def load_t2m_statistics(**kwargs):
+    """
+    ERA5 2 m temperature ensemble mean and spread ('t2m_mean', 't2m_std'), loaded into memory (it is a small global grid).
+    """
+    return load_derived_product('era5_t2m_statistics', **kwargs).load()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the cached products derived from external datasets.")
+    parser.add_argument('products', type=str, nargs='*', help=f"Products to build. Default: all of {list(DERIVED_PRODUCTS)}")
+    parser.add_argument('--derived-dir', type=str, default=DERIVED_DIR, help="Directory of the stored products")
+    parser.add_argument('--force', action='store_true', help="Recompute products even if they are current")
+    args = parser.parse_args()
+
+    for name in args.products or list(DERIVED_PRODUCTS):
+        ds = load_derived_product(name, derived_dir=args.derived_dir, force=args.force)
+        print(f"{name}: {dict(ds.sizes)}, sources {ds.attrs['derived_product_sources']}")
@@ -0,0 +1,116 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+@contextlib.contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold a lock on path (created if it doesn't exist) for the duration of the block.
+
+    Exclusive locks exclude every other holder of a lock on the same path, across threads and
+    processes. Shared locks only exclude exclusive ones. The locks are advisory (flock), so they only
+    coordinate code that uses file_lock.
+    """
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _read_umask():
+    # The umask can only be read by setting it, so set it back right away
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# Read once at import, since setting the umask (even briefly) would affect files created by other threads
+UMASK = _read_umask()
+
+def write_json_atomic(obj, path, **kwargs):
+    """
+    Write obj as JSON to a temporary file next to path and move it into place, so readers never see a partial file.
+    The file gets the usual permissions for new files (0666 minus the umask).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(obj, f, **kwargs)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, 0o666 & ~UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+class FileHasher:
+    """
+    Content hashes of files and directories, cached by (size, mtime) so unchanged files aren't re-read.
+
+    Files are hashed by content (sha256). Directories (e.g. zarr stores and model outputs) are hashed
+    from the relative path and content hash of every file in them, so rewriting a directory with the
+    same bytes gives the same hash.
+
+    The cache file may be shared by several processes: save merges this process's entries into the
+    current file under a lock and replaces it atomically.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.cache = {}
+        self._lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                self.cache = json.load(f)
+
+    def file_digest(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            cached = self.cache.get(key)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(8 * 1024 * 1024), b''):
+                h.update(block)
+        digest = h.hexdigest()
+
+        with self._lock:
+            self.cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+        return digest
+
+    def digest(self, path):
+        """
+        Hash of a file or directory, or None if it doesn't exist.
+        """
+        if os.path.isfile(path):
+            return self.file_digest(path)
+        if not os.path.isdir(path):
+            return None
+
+        h = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for fn in sorted(filenames):
+                full_path = os.path.join(dirpath, fn)
+                h.update(f"{os.path.relpath(full_path, path)}:{self.file_digest(full_path)}\n".encode())
+        return 'dir:' + h.hexdigest()
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with self._lock, file_lock(self.cache_path + '.lock'):
+            # Keep entries added by other processes since this cache was loaded
+            cache = {}
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path, 'r') as f:
+                    cache = json.load(f)
+            cache.update(self.cache)
+            self.cache = cache
+            write_json_atomic(self.cache, self.cache_path)
@@ -0,0 +1,189 @@
+'''
+Build the gridded input stack used for gridded predictions (BedMachine thickness/errbed/mask/surface,
+surface speed and ERA5 2 m temperature) at any resolution and extent.
+
+The output grid is processed one tile at a time. Sources are opened lazily with Dask chunks, so each
+tile reads only the parts of the sources it overlaps, and each tile is written into its own region
+of a chunked zarr store. Memory use depends on the tile size, not on the size of the grid.
+
+Usage:
+    python gridded_inputs.py --dataset antarctica --output data_preprocessing/input_data_ais.zarr
+    python gridded_inputs.py --dataset greenland --resolution 300 --extent -250000 -50000 -2400000 -2200000 --output regional.zarr
+'''
+
+import argparse
+import concurrent.futures
+import warnings
+
+import cartopy.crs as ccrs
+import dask.array
+import numpy as np
+import xarray as xr
+import zarr
+
+from derived_products import load_t2m_statistics, load_velocity
+from interpolation_utils import interpolate_from_regular_grid, resample_block_mean
+
+SOURCE_DATASETS = {
+    'antarctica': {
+        'bedmachine': 'external_datasets/BedMachineAntarctica-v3.nc',
+        'projection': ccrs.Stereographic(central_latitude=-90, true_scale_latitude=-71),
+        'resolution': 1000, # BedMachine Antarctica has 500 m spacing
+    },
+    'greenland': {
+        'bedmachine': 'external_datasets/BedMachineGreenland-v5.nc',
+        'projection': ccrs.Stereographic(central_latitude=90, central_longitude=-45, true_scale_latitude=70),
+        'resolution': 900, # BedMachine Greenland has 150 m spacing
+    },
+}
+
+BEDMACHINE_VARIABLES = ['thickness', 'errbed', 'mask', 'surface']
+DERIVED_VARIABLES = ['speed', 'speed_err', 't2m', 't2m_err']
+
+def open_sources(dataset, source_chunk_size=2048):
+    """
+    Lazily open the source datasets for an ice sheet.
+
+    Parameters:
+        dataset (str): Key of SOURCE_DATASETS ('antarctica' or 'greenland')
+        source_chunk_size (int): Dask chunk size along x and y of the gridded sources
+
+    Returns:
+        (ds_bm, ds_vel, ds_t2m): BedMachine and velocity (with 'speed' and 'speed_err') as lazy
+        Dask-backed datasets, and the ERA5 t2m ensemble mean and spread ('t2m_mean', 't2m_std')
+        in memory (it is a small global grid). Speed and the ERA5 statistics come from the
+        derived product cache.
+    """
+    chunks = {'x': source_chunk_size, 'y': source_chunk_size}
+    ds_bm = xr.open_dataset(SOURCE_DATASETS[dataset]['bedmachine'], chunks=chunks)
+
+    # Speed and the ERA5 statistics are computed once and cached (see derived_products.py)
+    ds_vel = load_velocity(dataset, chunk_size=source_chunk_size)
+    ds_t2m = load_t2m_statistics()
+
+    return ds_bm, ds_vel, ds_t2m
+
+def target_grid(ds_bm, resolution, extent=None):
+    """
+    Coordinates of the output grid: a lattice of spacing resolution anchored on the first BedMachine
+    cell (so a resolution of k BedMachine cells selects every k-th cell), limited to the BedMachine
+    domain and to extent if given.
+
+    Parameters:
+        ds_bm (xr.Dataset): BedMachine dataset
+        resolution (float): Output grid spacing in meters
+        extent (tuple): (x_min, x_max, y_min, y_max) of the output grid, or None for the full domain
+
+    Returns:
+        (x, y): Coordinate arrays, in the same direction as the BedMachine axes
+    """
+    axes = []
+    for i, name in enumerate(('x', 'y')):
+        coord = ds_bm[name].values.astype(np.float64)
+        step = resolution if coord[-1] > coord[0] else -resolution
+        values = coord[0] + step * np.arange(int(np.floor(abs(coord[-1] - coord[0]) / resolution)) + 1)
+        if extent is not None:
+            lo, hi = sorted(extent[2 * i:2 * i + 2])
+            values = values[(values >= lo) & (values <= hi)]
+        axes.append(values)
+
+    if len(axes[0]) == 0 or len(axes[1]) == 0:
+        raise ValueError(f"Extent {extent} does not overlap the BedMachine domain")
+    return axes[0], axes[1]
+
+def build_tile(ds_bm, ds_vel, ds_t2m, x, y, projection, resolution):
+    """
+    Compute every gridded input on one tile of the output grid.
+
+    BedMachine variables are sampled at the nearest BedMachine cell, speed is the area-weighted
+    mean of the velocity cells overlapping each output cell, and t2m is the nearest ERA5 cell.
+    resolution is the output cell width, which tiles with a single row or column can't infer.
+
+    Returns:
+        xr.Dataset: The tile, with BEDMACHINE_VARIABLES and DERIVED_VARIABLES on (y, x)
+    """
+    ds_tile = ds_bm[BEDMACHINE_VARIABLES].sel(x=x, y=y, method='nearest').load()
+    ds_tile = ds_tile.assign_coords(x=x, y=y)
+
+    # Surface velocity
+    # Area-weighted mean of all velocity cells overlapping each output cell
+    ds_tile['speed'], ds_tile['speed_err'] = resample_block_mean(ds_vel, ds_tile, ['speed', 'speed_err'], resolution=resolution)
+
+    # Surface temperature
+    # Since this data is very coarse anyway, we'll just use the nearest cell
+    ds_tile['t2m'], ds_tile['t2m_err'] = interpolate_from_regular_grid(
+        ds_t2m, ds_tile, ['t2m_mean', 't2m_std'], method='nearest', x_name='longitude', y_name='latitude',
+        source_crs=ccrs.PlateCarree(), target_crs=projection, target_gridded=True)
+
+    for v in DERIVED_VARIABLES:
+        ds_tile[v] = ds_tile[v].astype(np.float32)
+    for v in ds_tile.variables:
+        ds_tile[v].encoding = {} # Source (NetCDF) encodings don't apply to the zarr store
+    return ds_tile
+
+def build_gridded_inputs(dataset, output_path, resolution=None, extent=None, tile_size=1024, jobs=1, source_chunk_size=2048):
+    """
+    Build the gridded input stack for an ice sheet and write it to a chunked zarr store.
+
+    Parameters:
+        dataset (str): Key of SOURCE_DATASETS ('antarctica' or 'greenland')
+        output_path (str): Path of the zarr store (overwritten if it exists)
+        resolution (float): Output grid spacing in meters. Defaults to the resolution in SOURCE_DATASETS.
+        extent (tuple): (x_min, x_max, y_min, y_max) of the output grid, or None for the full BedMachine domain
+        tile_size (int): Number of output cells along each side of a tile, which is also the zarr chunk size
+        jobs (int): Number of tiles to process in parallel
+        source_chunk_size (int): Dask chunk size along x and y of the gridded sources
+
+    Returns:
+        str: Path to the zarr store
+    """
+    if dataset not in SOURCE_DATASETS:
+        raise ValueError(f"Unknown dataset '{dataset}'. Options are: {list(SOURCE_DATASETS)}")
+    resolution = resolution or SOURCE_DATASETS[dataset]['resolution']
+    projection = SOURCE_DATASETS[dataset]['projection']
+
+    ds_bm, ds_vel, ds_t2m = open_sources(dataset, source_chunk_size)
+    x, y = target_grid(ds_bm, resolution, extent)
+
+    # Write the metadata, coordinates and empty chunked variables, then fill the store tile by tile
+    template = xr.Dataset(coords={'x': ('x', x, ds_bm['x'].attrs), 'y': ('y', y, ds_bm['y'].attrs)},
+                          attrs={**ds_bm.attrs, 'resolution': resolution})
+    for v in BEDMACHINE_VARIABLES + DERIVED_VARIABLES:
+        dtype = ds_bm[v].dtype if v in BEDMACHINE_VARIABLES else np.float32
+        attrs = ds_bm[v].attrs if v in BEDMACHINE_VARIABLES else {}
+        template[v] = (('y', 'x'), dask.array.empty((len(y), len(x)), dtype=dtype, chunks=tile_size), attrs)
+    encoding = {v: {'chunks': (tile_size, tile_size)} for v in template.data_vars}
+    template.to_zarr(output_path, mode='w', compute=False, encoding=encoding, consolidated=False)
+
+    tiles = [(slice(i, min(i + tile_size, len(y))), slice(j, min(j + tile_size, len(x))))
+             for i in range(0, len(y), tile_size) for j in range(0, len(x), tile_size)]
+
+    def process_tile(tile):
+        rows, cols = tile
+        ds_tile = build_tile(ds_bm, ds_vel, ds_t2m, x[cols], y[rows], projection, resolution)
+        ds_tile.drop_vars(['x', 'y']).to_zarr(output_path, region={'y': rows, 'x': cols}, consolidated=False)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for n_done, _ in enumerate(executor.map(process_tile, tiles), start=1):
+            print(f"Finished tile {n_done} of {len(tiles)}", flush=True)
+
+    with warnings.catch_warnings():
+        # Consolidated metadata is not yet part of the zarr v3 spec, but zarr-python and xarray support it
+        warnings.filterwarnings('ignore', message='Consolidated metadata', category=UserWarning)
+        zarr.consolidate_metadata(output_path)
+
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the gridded input datasets used for gridded predictions.")
+    parser.add_argument('--dataset', type=str, required=True, choices=list(SOURCE_DATASETS), help="Ice sheet to build inputs for")
+    parser.add_argument('--output', type=str, required=True, help="Output zarr store")
+    parser.add_argument('--resolution', type=float, default=None, help="Grid spacing in meters. Default: 1000 (Antarctica) or 900 (Greenland)")
+    parser.add_argument('--extent', type=float, nargs=4, default=None, metavar=('X_MIN', 'X_MAX', 'Y_MIN', 'Y_MAX'),
+                        help="Extent of the output grid in projected coordinates. Default: the full BedMachine domain")
+    parser.add_argument('--tile-size', type=int, default=1024, help="Number of output cells along each side of a tile")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of tiles to process in parallel")
+    args = parser.parse_args()
+
+    build_gridded_inputs(args.dataset, args.output, resolution=args.resolution, extent=args.extent,
+                         tile_size=args.tile_size, jobs=args.jobs)
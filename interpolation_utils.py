@@ -1,8 +1,11 @@
+import warnings
 import xarray as xr
 import numpy as np
+import scipy.sparse
 import scipy.spatial
 
-def interpolate_nearest_from_grid(ds_source, ds_target, field_names, x_name='x', y_name='y', source_crs=None, target_crs=None, target_gridded=False):
+def interpolate_nearest_from_grid(ds_source, ds_target, field_names, x_name='x', y_name='y', source_crs=None, target_crs=None, target_gridded=False,
+                                  distance_upper_bound=np.inf, workers=-1, compact_coords=False, compact_tolerance=0.01, chunk_size=1_000_000):
     """
     Interpolate a gridded field from ds_source to ungridded points in ds_target using nearest neighbor.
 
@@ -15,6 +18,14 @@ def interpolate_nearest_from_grid(ds_source, ds_target, field_names, x_name='x',
         source_crs (pyproj.CRS): Coordinate reference system of the source dataset
         target_crs (pyproj.CRS): Coordinate reference system of the target dataset
         target_gridded (bool): If True, treat the x and y coordiantes of ds_target as axes and return a gridded dataset
+        distance_upper_bound (float): Targets with no source point within this distance are set to NaN
+        workers (int): Number of threads used for the KD-tree query (-1 uses all cores)
+        compact_coords (bool): If True, hold target coordinates as float32 (halving their memory) when the float32
+            rounding error is at most compact_tolerance times the source grid spacing. Off by default, since
+            rounding can move targets onto a different nearest source cell.
+        compact_tolerance (float): Largest float32 rounding error allowed by compact_coords, as a fraction
+            of the smallest distance between source points
+        chunk_size (int): Number of target points to query at a time
 
     Returns:
         xr.DataArray: Interpolated field with same coords/dims as ds_target or a list of the same length as field_names
@@ -34,7 +45,7 @@ def interpolate_nearest_from_grid(ds_source, ds_target, field_names, x_name='x',
         #print((np.min(X_src), np.max(X_src), np.min(Y_src), np.max(Y_src)))
     Z_src = [ds_source[fn].values for fn in field_names]
 
-    # Flatten for KDTree
+    # Flatten for KDTree (kept as float64 since the tree holds a float64 copy anyway)
     source_points = np.column_stack((X_src, Y_src))
     source_values = [z.ravel() for z in Z_src]
 
@@ -48,16 +59,24 @@ def interpolate_nearest_from_grid(ds_source, ds_target, field_names, x_name='x',
         x_tgt = x_mesh.ravel()
         y_tgt = y_mesh.ravel()
     
-    target_points = np.column_stack((x_tgt, y_tgt))
-
     # Build KDTree and query nearest neighbors
     tree = scipy.spatial.KDTree(source_points)
+
+    tolerance = compact_tolerance * _source_spacing(tree) if compact_coords else 0
+    target_points = _stack_points(x_tgt, y_tgt, compact_coords, tolerance)
     interpolated_values = []
 
-    dists, idx = tree.query(target_points, k=1)
+    dists, idx = query_nearest(tree, target_points, distance_upper_bound=distance_upper_bound,
+                               workers=workers, chunk_size=chunk_size)
+    found = idx < tree.n
     for sv in source_values:
         # For each source variable, take the value at the nearest neighbor
-        tmp = np.array(sv[idx])
+        if np.all(found):
+            tmp = np.array(sv[idx])
+        else:
+            # Targets without a source point within distance_upper_bound get NaN
+            tmp = np.full(idx.shape, np.nan, dtype=np.result_type(sv.dtype, np.float32))
+            tmp[found] = sv[idx[found]]
 
         # If target is gridded, reshape to the original grid shape
         if target_gridded:
@@ -65,25 +84,521 @@ def interpolate_nearest_from_grid(ds_source, ds_target, field_names, x_name='x',
         
         interpolated_values.append(tmp)
 
-    # Convert to DataArray
+    return _to_dataarrays(interpolated_values, field_names, ds_target, target_gridded)
+
+def _source_spacing(tree, n_samples=1000):
+    """
+    Smallest distance from a sample of the source points in tree to their nearest other source point.
+    """
+    sample = tree.data[::max(1, tree.n // n_samples)]
+    dists, _ = tree.query(sample, k=2)
+    dists = dists[:, 1]
+    dists = dists[np.isfinite(dists) & (dists > 0)]
+    return dists.min() if len(dists) > 0 else 0
+
+def _stack_points(x, y, compact=False, tolerance=0):
+    """
+    Stack x and y coordinates into an (n, 2) array.
+
+    If compact is True and float32 can represent the coordinates to within tolerance (in coordinate
+    units, e.g. meters for polar stereographic coordinates), the points are stored as float32.
+    """
+    points = np.column_stack((x, y))
+    if compact and points.dtype != np.float32 and points.size > 0:
+        max_abs = np.nanmax(np.abs(points))
+        if max_abs * np.finfo(np.float32).eps <= tolerance:
+            points = points.astype(np.float32)
+    return points
+
+def query_nearest(tree, target_points, distance_upper_bound=np.inf, workers=-1, chunk_size=1_000_000):
+    """
+    Query a KD-tree for the nearest neighbor of each target point.
+
+    Targets are queried in chunks, so only chunk_size points are converted to float64 at a time,
+    and each chunk is split across threads by the tree.
+
+    Parameters:
+        tree (scipy.spatial.KDTree or cKDTree): Tree built from the source points
+        target_points (np.ndarray): (n, 2) array of target points
+        distance_upper_bound (float): Maximum distance to search for a neighbor
+        workers (int): Number of threads to use (-1 uses all cores)
+        chunk_size (int): Number of target points to query at a time
+
+    Returns:
+        (dists, idx): Distance to and index of the nearest source point. Targets with no source
+        point within distance_upper_bound get a distance of inf and an index of tree.n.
+    """
+    dists = np.empty(len(target_points), dtype=np.float64)
+    idx = np.empty(len(target_points), dtype=np.int64)
+
+    for start in range(0, len(target_points), chunk_size):
+        stop = min(start + chunk_size, len(target_points))
+        dists[start:stop], idx[start:stop] = tree.query(np.asarray(target_points[start:stop], dtype=np.float64), k=1,
+                                                        distance_upper_bound=distance_upper_bound, workers=workers)
+
+    return dists, idx
+
+def _to_dataarrays(values_list, field_names, ds_target, target_gridded):
+    """
+    Wrap interpolated arrays as DataArrays on the ds_target coordinates.
+
+    Returns a single DataArray if only one field was interpolated, otherwise a list.
+    """
     if target_gridded:
-        interpolated_values_xr = [xr.DataArray(
+        values_xr = [xr.DataArray(
                 values,
                 dims=['y', 'x'],
                 coords={'x': ds_target.x, 'y': ds_target.y},
                 name=fn
-            ) for values, fn in zip(interpolated_values, field_names)
+            ) for values, fn in zip(values_list, field_names)
         ]
     else:
-        interpolated_values_xr = [xr.DataArray(
+        values_xr = [xr.DataArray(
                     values,
                     dims=['index'],
                     coords={'index': ds_target.index},
                     name=fn
-                ) for values, fn in zip(interpolated_values, field_names)
+                ) for values, fn in zip(values_list, field_names)
             ]
     
-    if len(interpolated_values_xr) == 1:
-        return interpolated_values_xr[0]
+    if len(values_xr) == 1:
+        return values_xr[0]
+    else:
+        return values_xr
+
+def _interpolation_taps(frac_idx, n, method):
+    """
+    Source indices and weights along one axis for fractional source indices frac_idx.
+
+    Returns (indices, weights), each of shape (n_points, n_taps). Taps that fall outside
+    of the source grid get zero weight (their index is clipped so it can still be gathered).
+    """
+    if method == 'nearest':
+        offsets = np.array([0])
+        base = np.round(frac_idx)
+        weights = np.ones((len(frac_idx), 1))
+    elif method == 'linear':
+        offsets = np.array([0, 1])
+        base = np.floor(frac_idx)
+        t = (frac_idx - base)[:, None]
+        weights = np.hstack((1 - t, t))
+    elif method == 'cubic':
+        # Keys cubic convolution kernel with a = -0.5 (Catmull-Rom)
+        offsets = np.array([-1, 0, 1, 2])
+        base = np.floor(frac_idx)
+        s = np.abs((frac_idx - base)[:, None] - offsets[None, :])
+        weights = np.where(s <= 1, 1.5 * s**3 - 2.5 * s**2 + 1,
+                           np.where(s < 2, -0.5 * s**3 + 2.5 * s**2 - 4 * s + 2, 0))
+    else:
+        raise ValueError(f"Unknown interpolation method '{method}'. Options are: 'nearest', 'linear', 'cubic'")
+
+    indices = base.astype(np.int64)[:, None] + offsets[None, :]
+    weights[(indices < 0) | (indices >= n)] = 0
+    return np.clip(indices, 0, n - 1), weights
+
+def _apply_taps(stacked_values, iy, wy, ix, wx):
+    """
+    Weighted sum of the taps for every field at once, ignoring NaN source cells.
+
+    Returns (result, valid_weight) where valid_weight is the fraction of the total absolute
+    tap weight that landed on valid source cells.
+    """
+    weights = wy[:, :, None] * wx[:, None, :] # (n_points, ky, kx)
+    values = stacked_values[:, iy[:, :, None], ix[:, None, :]] # (n_fields, n_points, ky, kx)
+
+    valid = np.isfinite(values)
+    values = np.where(valid, values, 0)
+
+    weight_sum = np.sum(weights * valid, axis=(2, 3))
+    abs_weight_total = np.sum(np.abs(weights), axis=(1, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = np.sum(values * weights, axis=(2, 3)) / weight_sum
+        valid_weight = np.sum(np.abs(weights) * valid, axis=(2, 3)) / abs_weight_total
+
+    return result, valid_weight
+
+def interpolate_from_regular_grid(ds_source, ds_target, field_names, method='linear', x_name='x', y_name='y',
+                                  source_crs=None, target_crs=None, target_gridded=False,
+                                  min_valid_weight=0.5, chunk_size=1_000_000):
+    """
+    Interpolate gridded field(s) from a regularly spaced ds_source to points (or a grid) in ds_target.
+
+    Cell indices and weights are computed once per target point and applied to all of the
+    requested fields together as one stacked array, so interpolating several fields costs
+    about the same as interpolating one.
+
+    NaN source cells (e.g. outside of the ice mask) are left out and the remaining weights are
+    renormalized. If less than min_valid_weight of the total weight is on valid cells, the result
+    is NaN. For cubic interpolation, points whose 4x4 neighborhood touches a NaN cell or the edge
+    of the grid fall back to the linear result.
+
+    Parameters:
+        ds_source (xr.Dataset): Gridded source dataset with regularly spaced (ascending or descending) x/y axes
+        ds_target (xr.Dataset): Ungridded target dataset with x/y coordinates
+        field_names (str or list of str): Name of the variable(s) to interpolate from ds_source
+        method (str): One of 'nearest', 'linear' (bilinear), or 'cubic' (bicubic convolution)
+        x_name (str): Name of x-coordinate in source datasets
+        y_name (str): Name of y-coordinate in source datasets
+        source_crs (cartopy.crs.CRS): Coordinate reference system of the source dataset
+        target_crs (cartopy.crs.CRS): Coordinate reference system of the target dataset
+            If both are provided, target points are transformed into the source CRS (e.g. lon/lat for ERA5)
+        target_gridded (bool): If True, treat the x and y coordiantes of ds_target as axes and return a gridded dataset
+        min_valid_weight (float): Minimum fraction of interpolation weight on valid source cells
+        chunk_size (int): Number of target points to interpolate at a time
+
+    Returns:
+        xr.DataArray: Interpolated field with same coords/dims as ds_target or a list of the same length as field_names
+    """
+
+    if isinstance(field_names, str):
+        field_names = [field_names]
+
+    x_src = ds_source[x_name].values.astype(np.float64)
+    y_src = ds_source[y_name].values.astype(np.float64)
+    dx, dy = np.diff(x_src), np.diff(y_src)
+    if (not np.allclose(dx, dx[0])) or (not np.allclose(dy, dy[0])):
+        raise ValueError("Source grid must be regularly spaced. Use interpolate_nearest_from_grid for irregular grids.")
+    dx, dy = dx[0], dy[0]
+
+    x_tgt = ds_target['x'].values
+    y_tgt = ds_target['y'].values
+    if target_gridded:
+        x_mesh, y_mesh = np.meshgrid(x_tgt, y_tgt)
+        x_tgt, y_tgt = x_mesh.ravel(), y_mesh.ravel()
+
+    # Longitudes of a geographic source (e.g. ERA5 on PlateCarree) are periodic, and an axis that
+    # covers the full circle wraps around
+    geographic = (source_crs is not None) and source_crs.is_geographic
+    periodic_x = geographic and np.isclose(abs(dx) * len(x_src), 360)
+
+    if source_crs is not None:
+        coords = source_crs.transform_points(target_crs, x_tgt, y_tgt)
+        x_tgt, y_tgt = coords[:, 0], coords[:, 1]
+        if geographic:
+            # Wrap longitudes into the range covered by the source grid (e.g. 0-360 for ERA5)
+            x_tgt = (x_tgt - min(x_src[0], x_src[-1])) % 360 + min(x_src[0], x_src[-1])
+
+    # Stack all fields so that each tap is gathered for every field at once
+    stacked_values = np.stack([ds_source[fn].transpose(y_name, x_name).values.astype(np.float64) for fn in field_names])
+
+    if periodic_x:
+        # Repeat the westernmost column east of the easternmost one, so points between them are interpolated across the seam
+        if dx > 0:
+            stacked_values = np.concatenate((stacked_values, stacked_values[:, :, :1]), axis=2)
+            x_src = np.append(x_src, x_src[-1] + dx)
+        else:
+            stacked_values = np.concatenate((stacked_values[:, :, -1:], stacked_values), axis=2)
+            x_src = np.insert(x_src, 0, x_src[0] - dx)
+
+    interpolated_values = np.full((len(field_names), len(x_tgt)), np.nan)
+    for start in range(0, len(x_tgt), chunk_size):
+        stop = min(start + chunk_size, len(x_tgt))
+        fx = (x_tgt[start:stop] - x_src[0]) / dx
+        fy = (y_tgt[start:stop] - y_src[0]) / dy
+
+        # Points outside of the source grid get no value
+        inside = (fx >= -0.5) & (fx <= len(x_src) - 0.5) & (fy >= -0.5) & (fy <= len(y_src) - 0.5)
+
+        ix, wx = _interpolation_taps(fx, len(x_src), 'nearest' if method == 'nearest' else 'linear')
+        iy, wy = _interpolation_taps(fy, len(y_src), 'nearest' if method == 'nearest' else 'linear')
+        result, valid_weight = _apply_taps(stacked_values, iy, wy, ix, wx)
+        result[valid_weight < min_valid_weight] = np.nan
+
+        if method == 'cubic':
+            ix, wx = _interpolation_taps(fx, len(x_src), 'cubic')
+            iy, wy = _interpolation_taps(fy, len(y_src), 'cubic')
+            result_cubic, valid_weight = _apply_taps(stacked_values, iy, wy, ix, wx)
+
+            # The 4x4 neighborhood must be fully inside the grid and valid, otherwise keep the linear result
+            interior = (ix[:, 0] == np.floor(fx) - 1) & (ix[:, 3] == np.floor(fx) + 2) & \
+                       (iy[:, 0] == np.floor(fy) - 1) & (iy[:, 3] == np.floor(fy) + 2)
+            result = np.where((valid_weight == 1) & interior, result_cubic, result)
+
+        result[:, ~inside] = np.nan
+        interpolated_values[:, start:stop] = result
+
+    if target_gridded:
+        interpolated_values = interpolated_values.reshape((len(field_names),) + x_mesh.shape)
+
+    return _to_dataarrays(list(interpolated_values), field_names, ds_target, target_gridded)
+
+def _cell_edges(centers, width=None):
+    """
+    Lower and upper cell edges along one axis, given the cell centers.
+
+    The centers may be ascending or descending (BedMachine y is descending). If width is given,
+    every cell is width wide. Otherwise cells extend halfway to their neighbors and outer edges
+    are extrapolated by half of the neighboring spacing.
+    """
+    centers = np.asarray(centers, dtype=np.float64)
+    if width is not None:
+        return centers - abs(width) / 2, centers + abs(width) / 2
+    if centers.size < 2:
+        raise ValueError("At least two cells are needed along an axis to infer cell edges. Pass the cell width for single cell axes.")
+
+    midpoints = (centers[1:] + centers[:-1]) / 2
+    edges = np.concatenate((
+        [centers[0] - (midpoints[0] - centers[0])],
+        midpoints,
+        [centers[-1] + (centers[-1] - midpoints[-1])]
+    ))
+    return np.minimum(edges[:-1], edges[1:]), np.maximum(edges[:-1], edges[1:])
+
+def _overlap_weights(source_centers, target_centers, target_width=None):
+    """
+    Sparse (n_target, n_source) matrix of 1D overlap lengths between source and target cells.
+    """
+    src_lo, src_hi = _cell_edges(source_centers)
+    tgt_lo, tgt_hi = _cell_edges(target_centers, target_width)
+
+    # Target cells don't overlap each other, so sorting by the lower edge also sorts the upper edge
+    order = np.argsort(tgt_lo)
+    tgt_lo, tgt_hi = tgt_lo[order], tgt_hi[order]
+
+    # Range of target cells touched by each source cell
+    first = np.searchsorted(tgt_hi, src_lo, side='right')
+    last = np.searchsorted(tgt_lo, src_hi, side='left')
+    n_overlaps = np.maximum(last - first, 0)
+
+    src_idx = np.repeat(np.arange(len(src_lo)), n_overlaps)
+    tgt_idx = np.repeat(first, n_overlaps) + (np.arange(n_overlaps.sum()) - np.repeat(np.cumsum(n_overlaps) - n_overlaps, n_overlaps))
+
+    overlap = np.minimum(src_hi[src_idx], tgt_hi[tgt_idx]) - np.maximum(src_lo[src_idx], tgt_lo[tgt_idx])
+    keep = overlap > 0
+
+    return scipy.sparse.csr_matrix(
+        (overlap[keep], (order[tgt_idx[keep]], src_idx[keep])),
+        shape=(len(order), len(src_lo))
+    )
+
+def _block_alignment(source_centers, target_centers, target_width=None, tol=1e-6):
+    """
+    If each target cell is exactly an integer block of source cells, return (block_size, first_source_index).
+    Otherwise return None.
+
+    The target cell width is target_width if given, otherwise the spacing of target_centers.
+    """
+    source_centers = np.asarray(source_centers, dtype=np.float64)
+    target_centers = np.asarray(target_centers, dtype=np.float64)
+
+    source_spacing = np.diff(source_centers)
+    if len(source_spacing) == 0 or not np.allclose(source_spacing, source_spacing[0], rtol=tol):
+        return None
+    if len(target_centers) > 1:
+        target_spacing = np.diff(target_centers)
+        if not np.allclose(target_spacing, target_spacing[0], rtol=tol):
+            return None
+        step = target_spacing[0] if target_width is None else np.sign(target_spacing[0]) * abs(target_width)
+    else:
+        # A single cell has no direction, so it is taken along the source axis
+        step = np.sign(source_spacing[0]) * abs(target_width)
+
+    ratio = step / source_spacing[0]
+    block_size = int(np.round(ratio))
+    if block_size < 1 or np.abs(ratio - block_size) > tol * block_size:
+        return None
+
+    # Fractional source index of the first block's first cell
+    start = (target_centers[0] - source_centers[0]) / source_spacing[0] - (block_size - 1) / 2
+    if np.abs(start - np.round(start)) > tol * block_size:
+        return None
+
+    return block_size, int(np.round(start))
+
+def _read_source_block(da, y_name, x_name, y_start, y_stop, x_start, x_stop):
+    """
+    Read source[y_start:y_stop, x_start:x_stop] as float64, padding with NaN where the window leaves the grid.
+    """
+    ny, nx = da.sizes[y_name], da.sizes[x_name]
+    out = np.full((y_stop - y_start, x_stop - x_start), np.nan)
+
+    ys, ye = max(y_start, 0), min(y_stop, ny)
+    xs, xe = max(x_start, 0), min(x_stop, nx)
+    if ys < ye and xs < xe:
+        out[ys - y_start:ye - y_start, xs - x_start:xe - x_start] = da.isel({y_name: slice(ys, ye), x_name: slice(xs, xe)}).values
+
+    return out
+
+BLOCK_STATISTICS = {
+    'mean': np.nanmean,
+    'median': np.nanmedian,
+    'min': np.nanmin,
+    'max': np.nanmax,
+    'std': np.nanstd,
+    'count': lambda a, axis: np.sum(np.isfinite(a), axis=axis),
+    'coverage': lambda a, axis: np.mean(np.isfinite(a), axis=axis), # Fraction of valid (non-NaN) cells
+}
+
+CONSERVATIVE_STATISTICS = ['mean', 'std', 'coverage']
+
+def _target_cell_widths(x_src, y_src, x_tgt, y_tgt, resolution, tol=1e-6):
+    """
+    Width of the target cells along x and y: resolution if given, None (inferred from the target
+    spacing) for axes with several cells, and the source spacing for single cell axes.
+    """
+    if resolution is None or np.isscalar(resolution):
+        resolution = (resolution, resolution)
+
+    widths = []
+    for name, src, tgt, width in (('x', x_src, x_tgt, resolution[0]), ('y', y_src, y_tgt, resolution[1])):
+        if width is not None:
+            spacing = np.abs(np.diff(np.asarray(tgt, dtype=np.float64)))
+            if len(spacing) > 0 and not np.allclose(spacing, abs(width), rtol=tol):
+                raise ValueError(f"Target {name} spacing does not match the resolution {width}")
+        elif len(tgt) < 2:
+            if len(src) < 2:
+                raise ValueError(f"Cannot infer the width of the single target cell along {name}. Pass resolution.")
+            width = abs(float(src[1]) - float(src[0]))
+        widths.append(width)
+    return widths
+
+def resample_block_mean(ds_source, ds_target, field_names, statistic='mean', x_name='x', y_name='y', chunk_size=512, min_coverage=0.0,
+                        resolution=None):
+    """
+    Resample gridded field(s) from ds_source onto the grid of ds_target by area-weighted aggregation.
+
+    Unlike nearest neighbor sampling, every source cell contributes to the target cells it overlaps,
+    so the result is a correct aggregate (e.g. the mean velocity within each 1 km output cell).
+
+    Two engines are used depending on how the grids line up:
+    - If each target cell is an integer block of source cells (e.g. BedMachine 500 m -> 1 km),
+      source blocks are reshaped and reduced directly. Any statistic in BLOCK_STATISTICS is allowed.
+    - Otherwise (e.g. 450 m velocity -> 1 km), the exact overlap area between each source and
+      target cell is used as the weight. Only statistics in CONSERVATIVE_STATISTICS are allowed.
+
+    In both cases NaN source cells are ignored and the source is read in chunks of chunk_size
+    rows, so lazily opened (or Dask-backed) sources are streamed rather than loaded at once.
+
+    Both datasets must be in the same coordinate reference system.
+
+    Parameters:
+        ds_source (xr.Dataset): Gridded source dataset
+        ds_target (xr.Dataset): Gridded target dataset with x/y coordinate axes
+        field_names (str or list of str): Name of the variable(s) to resample from ds_source
+        statistic (str): Aggregation to compute in each target cell
+        x_name (str): Name of x-coordinate in source dataset
+        y_name (str): Name of y-coordinate in source dataset
+        chunk_size (int): Number of source rows to read at a time
+        min_coverage (float): Minimum fraction of a target cell that must be covered by valid
+            source cells, otherwise the result is NaN. Not applied to statistic='coverage'.
+        resolution (float or tuple): Target cell width (or (x, y) widths) in coordinate units. By default
+            it is inferred from the spacing of the ds_target axes, and axes with a single cell (e.g. the
+            last tile of a grid) take the source spacing, so pass it when resampling single cell axes.
+
+    Returns:
+        xr.DataArray: Resampled field on the ds_target grid or a list of the same length as field_names
+    """
+
+    if isinstance(field_names, str):
+        field_names = [field_names]
+
+    x_src, y_src = ds_source[x_name].values, ds_source[y_name].values
+    x_tgt, y_tgt = ds_target['x'].values, ds_target['y'].values
+
+    x_width, y_width = _target_cell_widths(x_src, y_src, x_tgt, y_tgt, resolution)
+    x_block, y_block = _block_alignment(x_src, x_tgt, x_width), _block_alignment(y_src, y_tgt, y_width)
+
+    if (x_block is not None) and (y_block is not None):
+        if statistic not in BLOCK_STATISTICS:
+            raise ValueError(f"Unknown statistic '{statistic}'. Options are: {list(BLOCK_STATISTICS)}")
+        resampled_values = _resample_integer_blocks(ds_source, field_names, statistic, x_name, y_name,
+                                                     x_block, y_block, len(x_tgt), len(y_tgt), chunk_size, min_coverage)
     else:
-        return interpolated_values_xr
\ No newline at end of file
+        if statistic not in CONSERVATIVE_STATISTICS:
+            raise ValueError(f"Statistic '{statistic}' requires target cells that are integer blocks of source cells. "
+                             f"For general grid pairs, options are: {CONSERVATIVE_STATISTICS}")
+        resampled_values = _resample_area_weighted(ds_source, field_names, statistic, x_name, y_name,
+                                                    x_tgt, y_tgt, x_width, y_width, chunk_size, min_coverage)
+
+    return _to_dataarrays(resampled_values, field_names, ds_target, target_gridded=True)
+
+def _resample_integer_blocks(ds_source, field_names, statistic, x_name, y_name, x_block, y_block, nx_tgt, ny_tgt, chunk_size, min_coverage):
+    """
+    Reduce integer-sized blocks of source cells, streaming over chunks of target rows.
+    """
+    (kx, x_start), (ky, y_start) = x_block, y_block
+    reduce = BLOCK_STATISTICS[statistic]
+
+    # Number of target rows per chunk, so that roughly chunk_size source rows are read at a time
+    rows_per_chunk = max(1, chunk_size // ky)
+
+    results = [np.full((ny_tgt, nx_tgt), np.nan) for _ in field_names]
+    for fn, result in zip(field_names, results):
+        da = ds_source[fn].transpose(y_name, x_name)
+        for row in range(0, ny_tgt, rows_per_chunk):
+            n_rows = min(rows_per_chunk, ny_tgt - row)
+            block = _read_source_block(da, y_name, x_name,
+                                       y_start + row * ky, y_start + (row + n_rows) * ky,
+                                       x_start, x_start + nx_tgt * kx)
+            block = block.reshape(n_rows, ky, nx_tgt, kx).transpose(0, 2, 1, 3).reshape(n_rows, nx_tgt, ky * kx)
+
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning) # All-NaN blocks are expected at mask edges
+                reduced = reduce(block, axis=-1).astype(np.float64)
+            if min_coverage > 0 and statistic != 'coverage':
+                reduced[np.mean(np.isfinite(block), axis=-1) < min_coverage] = np.nan
+            result[row:row + n_rows, :] = reduced
+
+    return results
+
+def _resample_area_weighted(ds_source, field_names, statistic, x_name, y_name, x_tgt, y_tgt, x_width, y_width, chunk_size, min_coverage):
+    """
+    Area-weighted aggregation for arbitrary pairs of rectilinear grids, streaming over chunks of source rows.
+    """
+    wx = _overlap_weights(ds_source[x_name].values, x_tgt, x_width) # (nx_tgt, nx_src)
+    wy = _overlap_weights(ds_source[y_name].values, y_tgt, y_width).tocsc() # (ny_tgt, ny_src)
+
+    # Only read source columns and rows that overlap the target grid
+    x_used = np.flatnonzero(wx.getnnz(axis=0))
+    y_used = np.flatnonzero(wy.getnnz(axis=0))
+    if len(x_used) == 0 or len(y_used) == 0:
+        return [np.full((len(y_tgt), len(x_tgt)), np.nan) for _ in field_names]
+    x_start, x_stop = x_used[0], x_used[-1] + 1
+    y_start, y_stop = y_used[0], y_used[-1] + 1
+    wx = wx[:, x_start:x_stop]
+
+    tgt_lo, tgt_hi = _cell_edges(x_tgt, x_width)
+    tgt_width = tgt_hi - tgt_lo
+    tgt_lo, tgt_hi = _cell_edges(y_tgt, y_width)
+    tgt_area = np.outer(tgt_hi - tgt_lo, tgt_width)
+
+    results = []
+    for fn in field_names:
+        da = ds_source[fn].transpose(y_name, x_name)
+
+        weight_sum = np.zeros((len(y_tgt), len(x_tgt)))
+        value_sum = np.zeros_like(weight_sum)
+        square_sum = np.zeros_like(weight_sum) if statistic == 'std' else None
+
+        for row in range(y_start, y_stop, chunk_size):
+            row_stop = min(row + chunk_size, y_stop)
+            wy_chunk = wy[:, row:row_stop]
+            if wy_chunk.nnz == 0:
+                continue
+
+            values = da.isel({y_name: slice(row, row_stop), x_name: slice(x_start, x_stop)}).values.astype(np.float64)
+            valid = np.isfinite(values)
+            values[~valid] = 0
+
+            # Aggregate along x (sparse @ dense) and then along y
+            weight_sum += wy_chunk @ (wx @ valid.T.astype(np.float64)).T
+            value_sum += wy_chunk @ (wx @ values.T).T
+            if square_sum is not None:
+                square_sum += wy_chunk @ (wx @ (values ** 2).T).T
+
+        coverage = weight_sum / tgt_area
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = value_sum / weight_sum
+            if statistic == 'mean':
+                result = mean
+            elif statistic == 'std':
+                result = np.sqrt(np.maximum(square_sum / weight_sum - mean ** 2, 0))
+            else:
+                result = coverage
+
+        if statistic != 'coverage':
+            result[(weight_sum <= 0) | (coverage < min_coverage)] = np.nan
+
+        results.append(result)
+
+    return results
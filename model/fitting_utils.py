@@ -0,0 +1,148 @@
+import numpy as np
+import scipy.optimize
+import scipy.special
+
+def _stack_datasets(datasets, feature_names, target_name, fit_intercept):
+    """
+    Concatenate the observations of every dataset into one design matrix.
+
+    Returns (names, X, y, group) where group[i] is the index into names of observation i.
+    """
+    names = list(datasets)
+    X, y, group = [], [], []
+    for g, name in enumerate(names):
+        df = datasets[name]
+        features = np.column_stack([np.asarray(df[f], dtype=np.float64) for f in feature_names])
+        if fit_intercept:
+            features = np.column_stack((np.ones(len(features)), features))
+        X.append(features)
+        y.append(np.asarray(df[target_name], dtype=np.float64))
+        group.append(np.full(len(features), g))
+
+    return names, np.vstack(X), np.concatenate(y), np.concatenate(group)
+
+def fit_least_squares(X, y, group, n_groups):
+    """
+    Closed-form least squares (Gaussian maximum likelihood) fit for every group at once.
+
+    The normal equations of all groups are accumulated with np.bincount and solved as one batch.
+
+    Returns:
+        (coefficients, sigma): (n_groups, n_features) coefficients and (n_groups,) residual standard deviations
+    """
+    n_features = X.shape[1]
+    XtX = np.empty((n_groups, n_features, n_features))
+    Xty = np.empty((n_groups, n_features))
+    for j in range(n_features):
+        Xty[:, j] = np.bincount(group, weights=X[:, j] * y, minlength=n_groups)
+        for k in range(j, n_features):
+            XtX[:, j, k] = XtX[:, k, j] = np.bincount(group, weights=X[:, j] * X[:, k], minlength=n_groups)
+
+    coefficients = np.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+
+    residuals = y - np.sum(X * coefficients[group], axis=1)
+    counts = np.bincount(group, minlength=n_groups)
+    sigma = np.sqrt(np.bincount(group, weights=residuals**2, minlength=n_groups) / counts)
+
+    return coefficients, sigma
+
+def student_t_neg_log_likelihood(theta, X, y, group, n_groups):
+    """
+    Mean negative log likelihood of a linear model with Student-T errors, and its analytic gradient.
+
+    theta holds the parameters of every group, one row of (coefficients..., log(sigma), log(nu))
+    per group, flattened. The objective is the sum over groups of each group's mean negative
+    log likelihood. Since groups don't share parameters, minimizing the sum fits each group
+    independently.
+
+    Returns:
+        (nll, gradient): The objective and its gradient with respect to theta
+    """
+    theta = theta.reshape(n_groups, -1)
+    coefficients = theta[:, :-2]
+    log_sigma, log_nu = theta[:, -2], theta[:, -1]
+    sigma, nu = np.exp(log_sigma), np.exp(log_nu)
+
+    counts = np.bincount(group, minlength=n_groups)
+
+    residuals = y - np.sum(X * coefficients[group], axis=1)
+    z = residuals**2 / (nu[group] * sigma[group]**2)
+    log1p_z = np.log1p(z)
+
+    # Mean negative log likelihood of each group
+    nll = (scipy.special.gammaln(nu / 2) - scipy.special.gammaln((nu + 1) / 2)
+           + 0.5 * np.log(nu * np.pi) + log_sigma
+           + 0.5 * (nu + 1) * np.bincount(group, weights=log1p_z, minlength=n_groups) / counts)
+
+    # d(nll_i)/d(coefficients) = -(nu + 1) * r_i * x_i / (nu * sigma^2 * (1 + z_i))
+    scale = -(nu[group] + 1) * residuals / (nu[group] * sigma[group]**2 * (1 + z))
+    grad_coefficients = np.column_stack([
+        np.bincount(group, weights=scale * X[:, j], minlength=n_groups) for j in range(X.shape[1])
+    ]) / counts[:, None]
+
+    # d(nll_i)/d(log sigma) = 1 - (nu + 1) * z_i / (1 + z_i)
+    z_ratio_mean = np.bincount(group, weights=z / (1 + z), minlength=n_groups) / counts
+    grad_log_sigma = 1 - (nu + 1) * z_ratio_mean
+
+    # d(nll_i)/d(nu), then chain rule for log(nu)
+    grad_nu = (0.5 * scipy.special.digamma(nu / 2) - 0.5 * scipy.special.digamma((nu + 1) / 2) + 0.5 / nu
+               + 0.5 * np.bincount(group, weights=log1p_z, minlength=n_groups) / counts
+               - 0.5 * (nu + 1) / nu * z_ratio_mean)
+    grad_log_nu = nu * grad_nu
+
+    gradient = np.column_stack((grad_coefficients, grad_log_sigma, grad_log_nu))
+    return np.sum(nll), gradient.ravel()
+
+def fit_student_t_ml(datasets, feature_names, target_name, coefficient_names=None, fit_intercept=True,
+                     nu_bounds=(0.5, 1000), initial_nu=4.0, max_iter=1000):
+    """
+    Maximum likelihood fit of the linear model with Student-T errors used in train_linear_model.ipynb,
+    for several datasets (model variants) in one call.
+
+    All datasets are stacked and fit together: a batched closed-form least squares fit gives the
+    starting point, then L-BFGS-B minimizes the summed negative log likelihood using its analytic
+    gradient (see student_t_neg_log_likelihood). The result is suitable for centering priors or as
+    initial values for sampling.
+
+    Parameters:
+        datasets (dict): Name -> DataFrame (or dict of arrays) with the feature and target columns,
+            e.g. {'cresis_ais_grounded': df_grounded, 'cresis_ais_floating': df_floating}
+        feature_names (list of str): Columns to use as (normalized) predictors
+        target_name (str): Column to predict
+        coefficient_names (list of str): Names for the coefficients of feature_names in the output.
+            Defaults to feature_names.
+        fit_intercept (bool): If True, fit an intercept (returned as 'intercept')
+        nu_bounds (tuple): Bounds on the Student-T degrees of freedom
+        initial_nu (float): Starting value for the degrees of freedom
+        max_iter (int): Maximum number of L-BFGS-B iterations
+
+    Returns:
+        dict: Dataset name -> dict of fitted 'intercept', coefficients, 'sigma', 'nu', and the
+        closed-form least squares coefficients under 'least_squares'
+    """
+    if coefficient_names is None:
+        coefficient_names = list(feature_names)
+    names, X, y, group = _stack_datasets(datasets, feature_names, target_name, fit_intercept)
+    n_groups = len(names)
+
+    ls_coefficients, ls_sigma = fit_least_squares(X, y, group, n_groups)
+
+    theta0 = np.column_stack((ls_coefficients, np.log(ls_sigma), np.full(n_groups, np.log(initial_nu))))
+    bounds = ([(None, None)] * X.shape[1] + [(None, None), tuple(np.log(nu_bounds))]) * n_groups
+
+    optimization = scipy.optimize.minimize(student_t_neg_log_likelihood, theta0.ravel(),
+                                           args=(X, y, group, n_groups), jac=True,
+                                           method='L-BFGS-B', bounds=bounds, options={'maxiter': max_iter})
+    theta = optimization.x.reshape(n_groups, -1)
+
+    all_names = (['intercept'] if fit_intercept else []) + list(coefficient_names)
+    results = {}
+    for g, name in enumerate(names):
+        results[name] = {n: float(theta[g, i]) for i, n in enumerate(all_names)}
+        results[name]['sigma'] = float(np.exp(theta[g, -2]))
+        results[name]['nu'] = float(np.exp(theta[g, -1]))
+        results[name]['least_squares'] = dict(zip(all_names, ls_coefficients[g].tolist()))
+        results[name]['n_obs'] = int(np.sum(group == g))
+        results[name]['converged'] = optimization.success
+
+    return results
@@ -0,0 +1,90 @@
+import datetime
+import json
+import os
+
+import numpy as np
+
+ARTIFACT_FORMAT = 'rssnr_linear_model'
+ARTIFACT_FORMAT_VERSION = 1
+
+MANIFEST_FILENAME = 'manifest.json'
+DRAWS_FILENAME = 'posterior_draws.npy'
+
+def save_model_artifact(path, training_results, posterior_draws=None, metadata=None):
+    """
+    Save a trained model as a compact artifact that can be loaded with only NumPy.
+
+    The artifact is a directory containing:
+    - manifest.json: format version, dataset description, normalization parameters,
+      BedMachine mask whitelist, and the names of the posterior variables
+    - posterior_draws.npy: (n_variables, n_draws) float64 array, one row per posterior variable
+
+    Parameters:
+        path (str): Directory to write the artifact to (created if needed, existing files are overwritten)
+        training_results (dict): Results dictionary from train_linear_model.ipynb. Must contain
+            'dataset_name', 'ice_sheet', 'bm_mask_whitelist', 'input_data_path' and
+            'normalization_parameters', and 'trace' unless posterior_draws is given.
+        posterior_draws (dict): Variable name -> 1D array of draws. If None, they are extracted
+            from training_results['trace'].
+        metadata (dict): Any additional JSON-serializable information to store
+
+    Returns:
+        str: Path to the artifact directory
+    """
+    if posterior_draws is None:
+        from prediction_utils import posterior_draws_from_trace
+        posterior_draws = posterior_draws_from_trace(training_results['trace'])
+
+    variables = list(posterior_draws)
+    draws = np.vstack([np.asarray(posterior_draws[v], dtype=np.float64).reshape(-1) for v in variables])
+
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'created': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'dataset_name': training_results['dataset_name'],
+        'ice_sheet': training_results['ice_sheet'],
+        'bm_mask_whitelist': [int(m) for m in training_results['bm_mask_whitelist']],
+        'input_data_path': training_results['input_data_path'],
+        'normalization_parameters': {
+            var: {k: float(v) for k, v in params.items()}
+            for var, params in training_results['normalization_parameters'].items()
+        },
+        'posterior_variables': variables,
+        'n_draws': draws.shape[1],
+        'metadata': metadata or {},
+    }
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, DRAWS_FILENAME), draws)
+    with open(os.path.join(path, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return path
+
+def load_model_artifact(path, mmap=True):
+    """
+    Load a model artifact written by save_model_artifact.
+
+    Parameters:
+        path (str): Artifact directory
+        mmap (bool): If True, memory-map the posterior draws instead of reading them into memory
+
+    Returns:
+        dict: The manifest entries ('dataset_name', 'ice_sheet', 'bm_mask_whitelist',
+        'normalization_parameters', ...) plus 'posterior_draws', a dict of variable name -> 1D array
+        that can be passed directly to prediction_utils.predict_rssnr_quantiles
+    """
+    with open(os.path.join(path, MANIFEST_FILENAME), 'r') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a {ARTIFACT_FORMAT} artifact")
+    if manifest['format_version'] > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Artifact format version {manifest['format_version']} is newer than the "
+                         f"supported version {ARTIFACT_FORMAT_VERSION}")
+
+    draws = np.load(os.path.join(path, DRAWS_FILENAME), mmap_mode='r' if mmap else None)
+
+    manifest['posterior_draws'] = {v: draws[i] for i, v in enumerate(manifest['posterior_variables'])}
+    return manifest
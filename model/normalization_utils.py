@@ -1,8 +1,10 @@
 import numpy as np
+import pandas as pd
+import xarray as xr
 
 def fit_combo_scaler(x):
-    median_x = np.median(x)
-    iqr_x = np.percentile(x, 75) - np.percentile(x, 25)
+    median_x = np.nanmedian(x)
+    iqr_x = np.nanpercentile(x, 75) - np.nanpercentile(x, 25)
     robust_x = (x - median_x) / iqr_x
 
     min_robust = np.nanmin(robust_x)
@@ -19,6 +21,8 @@ def fit_combo_scaler(x):
     }
 
 def combo_scaler(x, params):
+    # Only elementwise arithmetic, so Dask-backed arrays stay lazy
+
     # Step 1: Robust scaling
     robust_x = (x - params['median']) / params['iqr']
 
@@ -28,10 +32,189 @@ def combo_scaler(x, params):
     return scaled_x
 
 def inverse_combo_scaler(scaled_x, params):
+    # Only elementwise arithmetic, so Dask-backed arrays stay lazy
+
     # Step 1: Undo min-max scaling
     robust_x = ((scaled_x + 1) / 2) * (params['max_robust'] - params['min_robust']) + params['min_robust']
 
     # Step 2: Undo robust scaling
     original_x = robust_x * params['iqr'] + params['median']
 
-    return original_x
\ No newline at end of file
+    return original_x
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch for fitting scalers to data that doesn't fit in memory.
+
+    Values are kept exactly until more than exact_limit have been seen, so quantiles of smaller
+    datasets match np.quantile. After that, values are held in a stack of compactors of at most
+    sketch_size items each (a randomized KLL-style sketch): when a level fills up, it is sorted
+    and every other item is promoted to the next level with twice the weight. The rank error of
+    a quantile is then on the order of log2(n / sketch_size) / sketch_size.
+
+    NaN values are ignored. The exact minimum and maximum are always tracked.
+    """
+
+    def __init__(self, sketch_size=4096, exact_limit=10_000_000, seed=None):
+        self.sketch_size = sketch_size
+        self.exact_limit = exact_limit
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._exact = []
+        self._levels = None
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def is_exact(self):
+        return self._levels is None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+
+        self.count += values.size
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        if self.is_exact:
+            self._exact.append(values)
+            if self.count > self.exact_limit:
+                self._levels = [np.concatenate(self._exact)]
+                self._exact = []
+                self._compact()
+        else:
+            self._levels[0] = np.concatenate((self._levels[0], values))
+            self._compact()
+
+        return self
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one (e.g. sketches fit to separate chunks in parallel).
+        """
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+
+        if self.is_exact and other.is_exact and self.count <= self.exact_limit:
+            self._exact.extend(other._exact)
+            return self
+
+        if self.is_exact:
+            self._levels = [np.concatenate(self._exact)] if self._exact else [np.empty(0)]
+            self._exact = []
+        other_levels = other._levels if not other.is_exact else [np.concatenate(other._exact) if other._exact else np.empty(0)]
+
+        for h, level in enumerate(other_levels):
+            if h < len(self._levels):
+                self._levels[h] = np.concatenate((self._levels[h], level))
+            else:
+                self._levels.append(level)
+        self._compact()
+
+        return self
+
+    def _compact(self):
+        h = 0
+        while h < len(self._levels):
+            level = self._levels[h]
+            if len(level) > self.sketch_size:
+                level = np.sort(level)
+                # Compact an even number of items and leave any odd one out at this level
+                n_compact = len(level) - (len(level) % 2)
+                promoted = level[self._rng.integers(2):n_compact:2]
+                self._levels[h] = level[n_compact:]
+                if h + 1 == len(self._levels):
+                    self._levels.append(promoted)
+                else:
+                    self._levels[h + 1] = np.concatenate((self._levels[h + 1], promoted))
+            h += 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+
+        if self.is_exact:
+            return np.quantile(np.concatenate(self._exact), q)
+
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self._levels)])
+        order = np.argsort(values)
+        values, weights = values[order], weights[order]
+
+        # Position of each retained item in the (approximate) sorted data, from 0 to 1
+        positions = (np.cumsum(weights) - weights / 2) / np.sum(weights)
+        positions = np.concatenate(([0], positions, [1]))
+        values = np.concatenate(([self.min], values, [self.max]))
+        return np.interp(q, positions, values)
+
+def _iter_chunks(data, var_names, chunk_size):
+    """
+    Yield dicts of flat NumPy arrays, one per variable, chunk_size rows at a time.
+
+    data may be a pandas DataFrame, an xarray Dataset (lazily loaded or Dask-backed variables
+    are read one chunk at a time along their first dimension), a dict of array-likes
+    (e.g. Dask arrays), or any iterable of DataFrames/dicts that are already chunks.
+    """
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunk_size):
+            chunk = data.iloc[start:start + chunk_size]
+            yield {v: chunk[v].to_numpy() for v in var_names}
+    elif isinstance(data, xr.Dataset):
+        dim = data[var_names[0]].dims[0]
+        n_rows = data.sizes[dim]
+        # For gridded variables, keep the number of values read at a time near chunk_size
+        row_size = max(1, int(np.prod([data.sizes[d] for d in data[var_names[0]].dims[1:]])))
+        rows_per_chunk = max(1, chunk_size // row_size)
+        for start in range(0, n_rows, rows_per_chunk):
+            yield {v: data[v].isel({dim: slice(start, start + rows_per_chunk)}).values for v in var_names}
+    elif isinstance(data, dict):
+        n_rows = len(data[var_names[0]])
+        for start in range(0, n_rows, chunk_size):
+            yield {v: np.asarray(data[v][start:start + chunk_size]) for v in var_names}
+    else:
+        for chunk in data:
+            yield {v: np.asarray(chunk[v]) for v in var_names}
+
+def fit_combo_scalers(data, var_names, chunk_size=1_000_000, sketch_size=4096, exact_limit=10_000_000, seed=None):
+    """
+    Fit combo scaler parameters for several variables in one streaming pass over the data.
+
+    The parameters are the same as those from fit_combo_scaler: the robust scaling uses the median
+    and IQR, and since that scaling is increasing and affine, min_robust and max_robust follow
+    directly from the minimum and maximum. So each variable only needs one QuantileSketch plus its
+    min/max, and the data is read once. Quantiles are exact unless a variable has more than
+    exact_limit non-NaN values. NaN values are ignored.
+
+    Parameters:
+        data: pandas DataFrame, xarray Dataset, dict of arrays, or an iterable of chunks (see _iter_chunks)
+        var_names (list of str): Variables to fit scalers for
+        chunk_size (int): Number of values to read at a time
+        sketch_size (int): Compactor size of each QuantileSketch
+        exact_limit (int): Number of values per variable to hold exactly before switching to a sketch
+        seed (int): Seed for the sketch compaction
+
+    Returns:
+        dict: Variable name -> parameters for combo_scaler / inverse_combo_scaler
+    """
+    sketches = {v: QuantileSketch(sketch_size=sketch_size, exact_limit=exact_limit, seed=seed) for v in var_names}
+
+    for chunk in _iter_chunks(data, var_names, chunk_size):
+        for v in var_names:
+            sketches[v].update(chunk[v])
+
+    params = {}
+    for v, sketch in sketches.items():
+        q25, median_x, q75 = sketch.quantile([0.25, 0.5, 0.75])
+        iqr_x = q75 - q25
+        params[v] = {
+            'median': float(median_x),
+            'iqr': float(iqr_x),
+            'min_robust': float((sketch.min - median_x) / iqr_x),
+            'max_robust': float((sketch.max - median_x) / iqr_x),
+        }
+
+    return params
@@ -0,0 +1,108 @@
+import numpy as np
+import xarray as xr
+
+from normalization_utils import combo_scaler, inverse_combo_scaler
+
+# Linear model coefficients and the (normalized) gridded input each one multiplies
+MODEL_TERMS = {
+    'beta_thickness': 'thickness',
+    'beta_surface_temp': 't2m',
+    'beta_surface_elev': 'surface',
+}
+
+def posterior_draws_from_trace(trace, var_names=None):
+    """
+    Flatten the posterior of a PyMC/ArviZ trace into one 1D array of draws per variable.
+
+    Parameters:
+        trace (arviz.InferenceData): Trace returned by pm.sample
+        var_names (list of str): Variables to extract. Defaults to the intercept, the MODEL_TERMS
+            coefficients, and the Student-T sigma and nu (where present).
+
+    Returns:
+        dict: Variable name -> np.ndarray of shape (n_chains * n_draws,)
+    """
+    if var_names is None:
+        var_names = ['intercept'] + list(MODEL_TERMS) + ['sigma', 'nu']
+        var_names = [v for v in var_names if v in trace.posterior]
+
+    return {v: np.asarray(trace.posterior[v].values).reshape(-1) for v in var_names}
+
+def predict_rssnr_quantiles(pred_inputs, posterior_draws, normalization_parameters, bm_mask_whitelist,
+                            quantiles=(0.025, 0.5, 0.975), min_thickness=100, tile_size=128,
+                            include_noise=False, seed=None, dtype=np.float32):
+    """
+    Predict RSSNR quantiles on a grid from every posterior draw of the linear model.
+
+    The grid is processed in tiles of tile_size x tile_size cells. For each tile, the normalized
+    inputs of the valid cells are multiplied by the matrix of all posterior draws at once and the
+    result is reduced to the requested quantiles before moving on to the next tile. These are
+    quantiles of the predicted RSSNR in each cell, rather than predictions made from quantiles
+    of the individual coefficients.
+
+    Only one tile of inputs is read at a time, so lazily opened (or Dask-backed) inputs are streamed.
+    Peak working memory is about tile_size**2 * n_draws values.
+
+    Parameters:
+        pred_inputs (xr.Dataset): Gridded inputs with 'thickness', 't2m', 'surface' and 'mask' on (y, x)
+        posterior_draws (dict): Variable name -> 1D array of posterior draws (see posterior_draws_from_trace)
+        normalization_parameters (dict): Normalization parameters from training, keyed by variable name
+        bm_mask_whitelist (list of int): BedMachine mask values to predict for
+        quantiles (sequence of float): Quantiles of the predicted RSSNR to compute in each cell
+        min_thickness (float): Cells with ice thinner than this (in meters) are left as NaN
+        tile_size (int): Number of cells along each side of a tile
+        include_noise (bool): If True, add Student-T observation noise (using the 'sigma' and 'nu'
+            draws) to each draw, giving posterior predictive quantiles instead of quantiles of the mean
+        seed (int): Seed for the observation noise, if include_noise is True
+        dtype (np.dtype): Floating point type used for the batched matrix product
+
+    Returns:
+        xr.DataArray: Predicted RSSNR [dB] with dims ('quantile', 'y', 'x')
+    """
+    quantiles = np.atleast_1d(np.asarray(quantiles, dtype=np.float64))
+    rng = np.random.default_rng(seed)
+
+    # (n_terms + 1, n_draws) coefficient matrix. The intercept multiplies a column of ones.
+    coefficients = np.vstack([posterior_draws['intercept']] + [posterior_draws[b] for b in MODEL_TERMS]).astype(dtype)
+    if include_noise:
+        sigma = np.asarray(posterior_draws['sigma'], dtype=dtype)
+        nu = np.asarray(posterior_draws['nu'], dtype=np.float64)
+
+    input_names = list(MODEL_TERMS.values())
+    ny, nx = pred_inputs.sizes['y'], pred_inputs.sizes['x']
+    result = np.full((len(quantiles), ny, nx), np.nan, dtype=dtype)
+
+    for y0 in range(0, ny, tile_size):
+        for x0 in range(0, nx, tile_size):
+            tile = pred_inputs[input_names + ['mask']].isel(y=slice(y0, y0 + tile_size), x=slice(x0, x0 + tile_size))
+            tile_values = {v: tile[v].transpose('y', 'x').values for v in input_names + ['mask']}
+
+            valid = np.isin(tile_values['mask'], bm_mask_whitelist) & (tile_values['thickness'] > min_thickness)
+            for v in input_names:
+                valid &= np.isfinite(tile_values[v])
+            if not np.any(valid):
+                continue
+
+            design = np.empty((np.count_nonzero(valid), len(input_names) + 1), dtype=dtype)
+            design[:, 0] = 1
+            for i, v in enumerate(input_names):
+                design[:, i + 1] = combo_scaler(tile_values[v][valid], normalization_parameters[v])
+
+            # (n_valid_cells, n_draws) normalized predictions for every draw
+            predictions = design @ coefficients
+            if include_noise:
+                predictions += sigma * rng.standard_t(nu, size=predictions.shape).astype(dtype)
+
+            # The inverse scaler is increasing and affine, so it commutes with taking quantiles
+            predicted_quantiles = inverse_combo_scaler(np.quantile(predictions, quantiles, axis=1), normalization_parameters['snr'])
+
+            tile_result = result[:, y0:y0 + tile_size, x0:x0 + tile_size]
+            tile_result[:, valid] = predicted_quantiles
+
+    return xr.DataArray(
+        result,
+        dims=['quantile', 'y', 'x'],
+        coords={'quantile': quantiles, 'x': pred_inputs.x, 'y': pred_inputs.y},
+        name='rssnr_pred',
+        attrs={'long_name': 'Predicted RSSNR', 'units': 'dB'}
+    )
@@ -0,0 +1,138 @@
+import dask.array
+import numpy as np
+import xarray as xr
+import zarr
+
+def _pool_sum(values, factor):
+    """
+    Lazily sum non-overlapping factor x factor blocks over the last two axes of a Dask array, padding ragged edges with zeros.
+    """
+    ny, nx = values.shape[-2:]
+    pad_y, pad_x = (-ny) % factor, (-nx) % factor
+    values = dask.array.pad(values, [(0, 0)] * (values.ndim - 2) + [(0, pad_y), (0, pad_x)], mode='constant')
+    return dask.array.coarsen(np.sum, values, {values.ndim - 2: factor, values.ndim - 1: factor})
+
+def _pool_coordinate(coord, factor):
+    """
+    Mean of each group of factor consecutive coordinate values (the last group may be shorter).
+    """
+    coord = np.asarray(coord, dtype=np.float64)
+    starts = np.arange(0, len(coord), factor)
+    return np.add.reduceat(coord, starts) / np.diff(np.append(starts, len(coord)))
+
+def build_overviews(ds, n_levels=3, chunk_size=512):
+    """
+    Build overview levels of a gridded dataset by NaN-aware mean pooling.
+
+    Level k is downsampled by 2**k. Each level is pooled from the previous one, weighting each
+    cell by the number of valid full-resolution cells behind it, so every level is the exact
+    NaN-ignoring mean of the full-resolution cells it covers. Non-floating point variables
+    (e.g. masks) are subsampled instead of averaged.
+
+    The overview levels are lazy Dask arrays in chunks of chunk_size x chunk_size cells (with the
+    same dtype as ds), so writing them computes one tile at a time instead of holding the sums and
+    counts of the full grid in memory.
+
+    Parameters:
+        ds (xr.Dataset): Dataset with 'x' and 'y' dimensions
+        n_levels (int): Number of overview levels to build in addition to the full resolution
+        chunk_size (int): Number of cells along each side of the Dask chunks of the overview levels
+
+    Returns:
+        list of xr.Dataset: [full resolution, 2x, 4x, ...] datasets
+    """
+    levels = [ds]
+
+    float_vars = [v for v in ds.data_vars if np.issubdtype(ds[v].dtype, np.floating) and {'y', 'x'} <= set(ds[v].dims)]
+    other_vars = [v for v in ds.data_vars if v not in float_vars]
+
+    # Running (sum, count) of valid full-resolution cells, with y and x as the last two axes
+    state = {}
+    for v in float_vars:
+        da = ds[v].transpose(..., 'y', 'x')
+        values = da.chunk({d: (chunk_size if d in ('y', 'x') else -1) for d in da.dims}).data
+        valid = dask.array.isfinite(values)
+        state[v] = (dask.array.where(valid, values, 0).astype(np.float64), valid.astype(np.int32))
+
+    x, y = ds['x'].values, ds['y'].values
+    for level in range(1, n_levels + 1):
+        x, y = _pool_coordinate(x, 2), _pool_coordinate(y, 2)
+
+        data_vars = {}
+        for v in float_vars:
+            sums, counts = (_pool_sum(a, 2) for a in state[v])
+            chunks = sums.shape[:-2] + (chunk_size, chunk_size)
+            sums, counts = sums.rechunk(chunks), counts.rechunk(chunks)
+            state[v] = (sums, counts)
+            mean = dask.array.where(counts > 0, sums / dask.array.maximum(counts, 1), np.nan).astype(ds[v].dtype)
+            dims = [d for d in ds[v].dims if d not in ('y', 'x')] + ['y', 'x']
+            data_vars[v] = xr.DataArray(mean, dims=dims, attrs=ds[v].attrs).transpose(*ds[v].dims)
+
+        factor = 2 ** level
+        for v in other_vars:
+            data_vars[v] = ds[v].isel({d: slice(None, None, factor) for d in ('y', 'x') if d in ds[v].dims}).drop_vars(['x', 'y'], errors='ignore')
+
+        other_coords = {c: ds[c] for c in ds.coords if not ({'y', 'x'} & set(ds[c].dims))}
+        pooled = xr.Dataset(data_vars, coords={'x': x, 'y': y, **other_coords}, attrs=ds.attrs)
+        pooled.attrs['overview_factor'] = factor
+        levels.append(pooled)
+
+    return levels
+
+def write_tiled_predictions(ds, path, tile_size=512, n_levels=3):
+    """
+    Write gridded predictions to a chunked, compressed zarr store with precomputed overview levels.
+
+    The store contains one group per level ('level_0' at full resolution, 'level_1' downsampled
+    by 2x, 'level_2' by 4x, ...), each chunked into tile_size x tile_size tiles and compressed with
+    the zarr default compressor. Maps can then read a coarse level and regional extraction can read
+    only the tiles it needs (see open_prediction_level).
+
+    Parameters:
+        ds (xr.Dataset): Gridded predictions with 'x' and 'y' dimensions
+        path (str): Path to the output zarr store (overwritten if it exists)
+        tile_size (int): Number of cells along each side of a tile
+        n_levels (int): Number of overview levels in addition to the full resolution
+
+    Returns:
+        str: Path to the zarr store
+    """
+    levels = build_overviews(ds, n_levels=n_levels, chunk_size=tile_size)
+
+    root = zarr.open_group(path, mode='w')
+    for level, level_ds in enumerate(levels):
+        encoding = {}
+        for v in level_ds.data_vars:
+            dims = level_ds[v].dims
+            encoding[v] = {'chunks': tuple(tile_size if d in ('y', 'x') else 1 for d in dims)}
+            if np.issubdtype(level_ds[v].dtype, np.float64):
+                encoding[v]['dtype'] = 'float32'
+        level_ds.to_zarr(path, group=f'level_{level}', mode='w', encoding=encoding, consolidated=False)
+
+    root.attrs['overview_factors'] = [2 ** level for level in range(len(levels))]
+    root.attrs['shapes'] = [[level_ds.sizes['y'], level_ds.sizes['x']] for level_ds in levels]
+
+    return path
+
+def open_prediction_level(path, level=None, max_cells=None):
+    """
+    Lazily open one level of a store written by write_tiled_predictions.
+
+    Parameters:
+        path (str): Path to the zarr store
+        level (int): Level to open (0 is full resolution, level k is downsampled by 2**k)
+        max_cells (int): If level is None, open the finest level with at most this many (y * x) cells,
+            e.g. the number of pixels in a map. If both are None, the full resolution is opened.
+
+    Returns:
+        xr.Dataset: Lazily loaded dataset. Selecting a region (e.g. ds.sel(x=slice(...))) reads only
+        the tiles that overlap it.
+    """
+    if level is None:
+        level = 0
+        if max_cells is not None:
+            shapes = zarr.open_group(path, mode='r').attrs['shapes']
+            fitting = [i for i, (ny, nx) in enumerate(shapes) if ny * nx <= max_cells]
+            level = fitting[0] if fitting else len(shapes) - 1
+
+    return xr.open_zarr(path, group=f'level_{level}', consolidated=False)
@@ -0,0 +1,78 @@
+import operator
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+FILTER_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    'in': lambda a, b: np.isin(a, b),
+    'not in': lambda a, b: ~np.isin(a, b),
+}
+
+def load_training_data(input_data_path, variables, filters=None, dropna=True, chunk_size=1_000_000, dtype=np.float32):
+    """
+    Load selected variables of a *_with_inputs.nc file, filtering rows while reading.
+
+    Only the requested variables (and any used by filters) are read, chunk_size rows at a time.
+    Each chunk is filtered before moving on, so the full file is never materialized.
+
+    Parameters:
+        input_data_path (str): Path to a dataset written by interpolate_external_datasets.ipynb
+        variables (list of str): Variables to return as columns
+        filters (list of tuple): Row filters as (variable, operator, value), all of which must hold.
+            Operators are the keys of FILTER_OPERATORS, e.g. [('bm_mask', 'in', [2]), ('picked_thickness', '>', 0)]
+        dropna (bool): If True, drop rows where any of the requested variables is NaN
+        chunk_size (int): Number of rows to read at a time
+        dtype (np.dtype): Data type of the returned columns
+
+    Returns:
+        pd.DataFrame: One column per requested variable, indexed by the dataset's row index.
+        Empty (with the same columns) if the file has no rows or no row passes the filters.
+    """
+    if len(variables) == 0:
+        raise ValueError("At least one variable must be requested")
+    filters = filters or []
+    for name, op, _ in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown filter operator '{op}' for '{name}'. Options are: {list(FILTER_OPERATORS)}")
+
+    read_variables = list(dict.fromkeys(list(variables) + [name for name, _, _ in filters]))
+
+    # Start from empty columns, so a file with no rows gives an empty frame rather than nothing to concatenate
+    columns = {v: [np.empty(0, dtype=dtype)] for v in variables}
+
+    with xr.open_dataset(input_data_path) as ds:
+        missing = [v for v in read_variables if v not in ds.variables]
+        if missing:
+            raise KeyError(f"Variables not found in {input_data_path}: {missing}")
+
+        dim = ds[read_variables[0]].dims[0]
+        n_rows = ds.sizes[dim]
+        index = [np.empty(0, dtype=ds[dim].dtype if dim in ds.coords else np.int64)]
+
+        for start in range(0, n_rows, chunk_size):
+            rows = slice(start, min(start + chunk_size, n_rows))
+            chunk = {v: ds[v].isel({dim: rows}).values for v in read_variables}
+
+            keep = np.ones(rows.stop - rows.start, dtype=bool)
+            for name, op, value in filters:
+                keep &= FILTER_OPERATORS[op](chunk[name], value)
+            if dropna:
+                for v in variables:
+                    if np.issubdtype(chunk[v].dtype, np.floating):
+                        keep &= ~np.isnan(chunk[v])
+
+            for v in variables:
+                columns[v].append(chunk[v][keep].astype(dtype))
+            index.append(ds[dim].isel({dim: rows}).values[keep] if dim in ds.coords else np.arange(rows.start, rows.stop)[keep])
+
+    return pd.DataFrame(
+        {v: np.concatenate(columns[v]) for v in variables},
+        index=pd.Index(np.concatenate(index), name=dim)
+    )
@@ -0,0 +1,235 @@
+'''
+Run the dataset creation and modeling workflow as a dependency graph of cached stages.
+
+Stages are declared in pipeline.yaml with their command (or notebook), parameters, input files
+(deps) and output files (outs). A stage depends on any other stage that produces one of its deps.
+
+Each stage is content-hashed: the hash covers the command, the parameters and the contents of
+every dep. A stage is only re-run if that hash differs from the one recorded the last time it
+succeeded, or if any of its outputs are missing. Because deps are hashed after upstream stages
+finish, changing a training parameter re-runs training (and any prediction that uses a changed
+model) but not interpolation. Independent stages (e.g. AIS and GIS) run in parallel.
+
+Usage:
+    python pipeline.py                      # Run everything that is out of date
+    python pipeline.py train_cresis_ais_floating --dry-run
+    python pipeline.py --jobs 4 --force predict_cresis_gis_grounded
+'''
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import yaml
+
+from file_utils import FileHasher, write_json_atomic
+
+STATE_DIR = '.pipeline'
+LOCK_FILENAME = 'lock.json'
+HASH_CACHE_FILENAME = 'file_hashes.json'
+
+def load_stages(config_path):
+    """
+    Load stage definitions from a pipeline YAML file.
+
+    Returns:
+        dict: Stage name -> stage definition, with 'deps', 'outs' and 'params' always present
+    """
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+
+    stages = {}
+    for name, stage in config['stages'].items():
+        if ('cmd' in stage) == ('notebook' in stage):
+            raise ValueError(f"Stage '{name}' must define exactly one of 'cmd' or 'notebook'")
+        stages[name] = {
+            'cwd': '.',
+            'params': {},
+            **stage,
+            # Lists of shared deps may be included with YAML aliases, so flatten nested lists
+            'deps': _flatten(stage.get('deps', [])),
+            'outs': _flatten(stage.get('outs', [])),
+        }
+    return stages
+
+def _flatten(items):
+    flat = []
+    for item in items:
+        flat.extend(_flatten(item) if isinstance(item, list) else [item])
+    return flat
+
+def stage_dependencies(stages):
+    """
+    Map each stage to the set of stages that produce one of its deps.
+    """
+    producers = {}
+    for name, stage in stages.items():
+        for out in stage['outs']:
+            producers[os.path.normpath(out)] = name
+
+    return {
+        name: {producers[os.path.normpath(d)] for d in stage['deps'] if os.path.normpath(d) in producers} - {name}
+        for name, stage in stages.items()
+    }
+
+def select_stages(targets, dependencies):
+    """
+    The target stages plus everything upstream of them.
+    """
+    selected = set()
+    to_visit = list(targets)
+    while to_visit:
+        name = to_visit.pop()
+        if name in selected:
+            continue
+        if name not in dependencies:
+            raise KeyError(f"Unknown stage '{name}'")
+        selected.add(name)
+        to_visit.extend(dependencies[name])
+    return selected
+
+def stage_command(name, stage):
+    """
+    The shell command for a stage. Notebook stages are executed with papermill, with the stage
+    parameters injected after the notebook's cell tagged 'parameters'.
+    """
+    if 'cmd' in stage:
+        return stage['cmd'].format(**stage['params'])
+
+    notebook = os.path.relpath(stage['notebook'], stage['cwd'])
+    executed = os.path.relpath(os.path.join(STATE_DIR, 'notebooks', f"{name}.ipynb"), stage['cwd'])
+    params_file = os.path.relpath(os.path.join(STATE_DIR, 'params', f"{name}.yaml"), stage['cwd'])
+    return f"papermill {notebook} {executed} -f {params_file}"
+
+def stage_signature(name, stage, hasher):
+    """
+    Hash of everything that determines a stage's outputs: its command, parameters and the contents of its deps.
+    """
+    dep_hashes = {}
+    for d in stage['deps']:
+        digest = hasher.digest(d)
+        if digest is None:
+            raise FileNotFoundError(f"Stage '{name}' depends on '{d}', which does not exist")
+        dep_hashes[d] = digest
+
+    description = {
+        'command': stage_command(name, stage),
+        'cwd': stage['cwd'],
+        'params': stage['params'],
+        'deps': dep_hashes,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+def run_pipeline(config_path='pipeline.yaml', targets=None, jobs=1, force=False, dry_run=False):
+    """
+    Run all out-of-date stages needed for targets (or for every stage if targets is None).
+
+    Returns:
+        dict: Stage name -> one of 'cached', 'ran', 'would run', 'failed', 'skipped' (upstream failed)
+    """
+    stages = load_stages(config_path)
+    dependencies = stage_dependencies(stages)
+    selected = select_stages(targets, dependencies) if targets else set(stages)
+
+    os.makedirs(os.path.join(STATE_DIR, 'notebooks'), exist_ok=True)
+    os.makedirs(os.path.join(STATE_DIR, 'params'), exist_ok=True)
+    lock_path = os.path.join(STATE_DIR, LOCK_FILENAME)
+    lock = {}
+    if os.path.exists(lock_path):
+        with open(lock_path, 'r') as f:
+            lock = json.load(f)
+    lock_mutex = threading.Lock()
+    hasher = FileHasher(os.path.join(STATE_DIR, HASH_CACHE_FILENAME))
+
+    status = {}
+
+    def run_stage(name):
+        stage = stages[name]
+        upstream = dependencies[name] & selected
+        if any(status[u] in ('failed', 'skipped') for u in upstream):
+            return 'skipped'
+        if dry_run and any(status[u] == 'would run' for u in upstream):
+            return 'would run'
+
+        try:
+            signature = stage_signature(name, stage, hasher)
+        except FileNotFoundError as e:
+            print(f"[{name}] {e}", flush=True)
+            return 'failed'
+        outputs_exist = all(os.path.exists(o) for o in stage['outs'])
+        if (not force) and outputs_exist and lock.get(name, {}).get('signature') == signature:
+            return 'cached'
+        if dry_run:
+            return 'would run'
+
+        if 'notebook' in stage:
+            with open(os.path.join(STATE_DIR, 'params', f"{name}.yaml"), 'w') as f:
+                yaml.safe_dump(stage['params'], f)
+
+        for o in stage['outs']:
+            if os.path.dirname(o):
+                os.makedirs(os.path.dirname(o), exist_ok=True)
+
+        command = stage_command(name, stage)
+        print(f"[{name}] Running: {command}", flush=True)
+        with open(os.path.join(STATE_DIR, f"{name}.log"), 'w') as log:
+            result = subprocess.run(command, shell=True, cwd=stage['cwd'], stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            print(f"[{name}] Failed with exit code {result.returncode}. See {os.path.join(STATE_DIR, name + '.log')}", flush=True)
+            return 'failed'
+
+        missing = [o for o in stage['outs'] if not os.path.exists(o)]
+        if missing:
+            print(f"[{name}] Finished but did not produce: {missing}", flush=True)
+            return 'failed'
+
+        with lock_mutex:
+            lock[name] = {'signature': signature, 'outs': {o: hasher.digest(o) for o in stage['outs']}}
+            write_json_atomic(lock, lock_path, indent=2, sort_keys=True)
+        hasher.save()
+        return 'ran'
+
+    # Submit each stage as soon as all of its upstream stages have finished
+    remaining = set(selected)
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        while remaining or running:
+            ready = [n for n in remaining if all(u in status for u in dependencies[n] & selected)]
+            for name in sorted(ready):
+                remaining.discard(name)
+                running[executor.submit(run_stage, name)] = name
+
+            if not running:
+                raise RuntimeError(f"Dependency cycle between stages: {sorted(remaining)}")
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name] = future.result()
+                print(f"[{name}] {status[name]}", flush=True)
+
+    hasher.save()
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the RSSNR workflow, re-running only out-of-date stages.")
+    parser.add_argument('targets', nargs='*', help="Stages to run (with everything upstream of them). Default: all stages")
+    parser.add_argument('--config', type=str, default='pipeline.yaml', help="Pipeline definition file")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of independent stages to run in parallel")
+    parser.add_argument('--force', action='store_true', help="Re-run the selected stages even if they are up to date")
+    parser.add_argument('--dry-run', action='store_true', help="Only print which stages would run")
+    args = parser.parse_args()
+
+    status = run_pipeline(args.config, targets=args.targets or None, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+
+    print("\nSummary:")
+    for name, s in sorted(status.items()):
+        print(f"{name}: {s}")
+
+    if any(s == 'failed' for s in status.values()):
+        sys.exit(1)
@@ -0,0 +1,581 @@
+'''
+Measure the memory and CPU use of the pipeline entry points on synthetic inputs, and recommend the
+resources to request for production inputs (SLURM --mem-per-cpu and --cpus-per-task, Dask memory_limit).
+
+Each target is run in a fresh process at a few input sizes (scales). While it runs, a background
+thread samples the RSS of the process and its children to find the peak, and the CPU and wall time
+of the call are measured. A separate run at the largest scale traces allocations (tracemalloc) to
+attribute the memory near the peak to call sites, so tracing doesn't distort the RSS and timings.
+
+Peak RSS is fitted as a linear function of the input size and extrapolated to the production input
+size of each target. Everything runs offline: inputs are synthetic CReSIS frames, OPR flights and grids.
+
+Usage:
+    python resource_profiling.py                           # Profile every target
+    python resource_profiling.py calculate_rssnr raw_to_snr --scales 1 2 4 --output profile_report.json
+    python resource_profiling.py process_radar_line --production-input process_radar_line=2e9
+'''
+
+import argparse
+import concurrent.futures
+import contextlib
+import ctypes
+import gc
+import json
+import math
+import multiprocessing
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import psutil
+import scipy.constants
+import xarray as xr
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Entry points in these directories import their neighbors by module name
+SCRIPT_DIRS = [REPO_DIR, os.path.join(REPO_DIR, 'data_preprocessing'), os.path.join(REPO_DIR, 'data_preprocessing_xopr')]
+
+# Production input sizes used for the recommendations. A CSARP_standard frame is typically a few
+# hundred MB, and the largest flight in run_radar_line_processing.py has 42 frames.
+FRAME_BYTES = 200e6
+FLIGHT_FRAMES = 42
+BEDMACHINE_ANTARCTICA_BYTES = 13333 * 13333 * 4 * 4 # 4 float32 variables interpolated together
+VELOCITY_ANTARCTICA_BYTES = 12445 * 12445 * 4 * 2 # speed and speed_err as float32
+
+def _release_free_memory():
+    """
+    Return freed heap memory to the OS (glibc only), so memory freed before a measurement (e.g. while
+    building its inputs) isn't reused without showing up in the RSS.
+    """
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+class ResourceMonitor:
+    """
+    Context manager measuring the wall time, CPU time and peak RSS of the code it wraps.
+
+    RSS (of this process and its children) is sampled from a background thread every sample_interval_s.
+    If trace_allocations is True, tracemalloc runs during the block and a snapshot is taken whenever
+    traced memory grows by more than 10% over the previous snapshot. The allocations in the last
+    snapshot (near the peak) are attributed to the innermost line of the repository's code on their
+    call stack, so memory allocated inside numpy, xarray etc. is reported where our code called them.
+    """
+
+    def __init__(self, sample_interval_s=0.02, trace_allocations=False, top_n=15, trace_frames=30):
+        self.sample_interval_s = sample_interval_s
+        self.trace_allocations = trace_allocations
+        self.top_n = top_n
+        self.trace_frames = trace_frames
+        self.process = psutil.Process()
+        self._stop = threading.Event()
+        self._snapshot = None
+        self._snapshot_bytes = 0
+
+    def _rss(self):
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass # Exited between listing and sampling
+        return rss
+
+    def _cpu_s(self):
+        t = self.process.cpu_times()
+        return t.user + t.system + t.children_user + t.children_system
+
+    def _sample(self):
+        self.peak_rss = max(self.peak_rss, self._rss())
+        if self.trace_allocations:
+            traced = tracemalloc.get_traced_memory()[0]
+            if traced > 1.1 * self._snapshot_bytes:
+                self._snapshot = tracemalloc.take_snapshot()
+                self._snapshot_bytes = traced
+
+    def _run_sampler(self):
+        while not self._stop.wait(self.sample_interval_s):
+            self._sample()
+
+    def __enter__(self):
+        gc.collect()
+        _release_free_memory()
+        self.baseline_rss = self.peak_rss = self._rss()
+        if self.trace_allocations:
+            tracemalloc.start(self.trace_frames)
+        self._thread = threading.Thread(target=self._run_sampler, daemon=True)
+        self._cpu_start = self._cpu_s()
+        self._wall_start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_s = time.perf_counter() - self._wall_start
+        self.cpu_s = self._cpu_s() - self._cpu_start
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+        self.allocations = None
+        if self.trace_allocations:
+            self.traced_peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.allocations = self._top_allocations()
+        return False
+
+    def _top_allocations(self):
+        if self._snapshot is None:
+            return []
+        snapshot = self._snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+
+        sites = {}
+        for stat in snapshot.statistics('traceback'):
+            # Frames are ordered from the oldest to the most recent call
+            frames = [f for f in stat.traceback if f.filename.startswith(REPO_DIR) and f.filename != os.path.abspath(__file__)]
+            frame = frames[-1] if frames else stat.traceback[-1]
+            filename = os.path.relpath(frame.filename, REPO_DIR) if frame.filename.startswith(REPO_DIR) else frame.filename
+            site = sites.setdefault(f"{filename}:{frame.lineno}", {'size_bytes': 0, 'count': 0})
+            site['size_bytes'] += stat.size
+            site['count'] += stat.count
+
+        top = sorted(sites.items(), key=lambda item: item[1]['size_bytes'], reverse=True)[:self.top_n]
+        return [{'site': name, **site} for name, site in top]
+
+    def record(self):
+        record = {
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'cpu_utilization': self.cpu_s / self.wall_s if self.wall_s > 0 else np.nan,
+            'baseline_rss_bytes': self.baseline_rss,
+            'peak_rss_bytes': self.peak_rss,
+        }
+        if self.trace_allocations:
+            record['traced_peak_bytes'] = self.traced_peak_bytes
+            record['allocations'] = self.allocations
+        return record
+
+# Synthetic inputs
+
+def synthetic_cresis_frame(directory, name, n_traces=2000, n_samples=3000, seed=0):
+    """
+    Write a synthetic CReSIS frame: a picks CSV and a MAT file with Data, Time and GPS_time, as read by snrfinder.calculate_rssnr.
+
+    Returns:
+        (csv_path, mat_path): Paths of the written files
+    """
+    from scipy.io import savemat
+
+    rng = np.random.default_rng(seed)
+    dt = 1e-8
+    time_sod = 18000 + 0.05 * np.arange(n_traces)
+    surface = 500 + 50 * np.sin(np.arange(n_traces) / 200) # Range to the surface [m]
+    thickness = 1000 + 300 * np.sin(np.arange(n_traces) / 500) # Ice thickness [m]
+    latitude = -80 + 1e-4 * np.arange(n_traces)
+    longitude = 120 + 2e-4 * np.arange(n_traces)
+
+    # Power: exponentially distributed noise with surface and bed echoes
+    data = 1e-12 * rng.standard_exponential((n_samples, n_traces), dtype=np.float32)
+    traces = np.arange(n_traces)
+    surface_idx = np.round(surface / (scipy.constants.c / 2) / dt).astype(int)
+    bed_idx = surface_idx + np.round(thickness / (scipy.constants.c / np.sqrt(3.15) / 2) / dt).astype(int)
+    data[np.clip(surface_idx, 0, n_samples - 1), traces] += 1e-6
+    data[np.clip(bed_idx, 0, n_samples - 1), traces] += 1e-10
+
+    os.makedirs(directory, exist_ok=True)
+    csv_path = os.path.join(directory, f"{name}.csv")
+    mat_path = os.path.join(directory, f"{name}.mat")
+    pd.DataFrame({
+        'LAT': latitude, 'LON': longitude, 'UTCTIMESOD': time_sod,
+        'THICK': thickness, 'ELEVATION': 500.0, 'FRAME': 0, 'SURFACE': surface,
+        'BOTTOM': surface + thickness, 'QUALITY': 1,
+    }).to_csv(csv_path, index=False)
+    savemat(mat_path, {
+        'Data': data, 'Time': dt * np.arange(n_samples), 'GPS_time': 1.47e9 + time_sod,
+        'Latitude': latitude, 'Longitude': longitude,
+    })
+    return csv_path, mat_path
+
+class SyntheticOPRConnection:
+    """
+    Stand-in for xopr.opr_access.OPRConnection that serves synthetic frames and layer picks, so
+    process_radar_line can run offline. Frames are generated when loaded, like a download would be.
+    """
+
+    def __init__(self, n_frames=2, traces_per_frame=3000, n_samples=2000, trace_interval_s=0.02, seed=0):
+        self.n_frames = n_frames
+        self.traces_per_frame = traces_per_frame
+        self.n_samples = n_samples
+        self.trace_interval_s = trace_interval_s
+        self.seed = seed
+        self.dt = 1e-8
+
+        n_traces = n_frames * traces_per_frame
+        self.slow_time = pd.Timestamp('2016-10-26 05:00:00') + pd.to_timedelta(trace_interval_s * np.arange(n_traces), unit='s')
+        self.surface_twtt = (3e-6 + 3e-7 * np.sin(np.arange(n_traces) / 500))
+        self.bed_twtt = self.surface_twtt + 1e-5 + 2e-6 * np.sin(np.arange(n_traces) / 1500)
+
+    @property
+    def input_bytes(self):
+        return self.n_frames * self.traces_per_frame * self.n_samples * 4
+
+    def load_flight(self, season_name, flight_id=None):
+        rng = np.random.default_rng(self.seed)
+        twtt = self.dt * np.arange(self.n_samples)
+        frames = []
+        for i in range(self.n_frames):
+            traces = slice(i * self.traces_per_frame, (i + 1) * self.traces_per_frame)
+            n = self.traces_per_frame
+            data = 1e-12 * rng.standard_exponential((n, self.n_samples), dtype=np.float32)
+            for layer_twtt, power in ((self.surface_twtt, 1e-6), (self.bed_twtt, 1e-10)):
+                idx = np.clip(np.round(layer_twtt[traces] / self.dt).astype(int), 0, self.n_samples - 1)
+                data[np.arange(n), idx] += power
+
+            position = np.arange(traces.start, traces.stop)
+            frames.append(xr.Dataset({
+                'Data': (('slow_time', 'twtt'), data),
+                'Latitude': ('slow_time', -80 + 1e-5 * position),
+                'Longitude': ('slow_time', 120 + 2e-5 * position),
+                'Elevation': ('slow_time', 8000 + 10 * np.sin(position / 1000)),
+                'Heading': ('slow_time', np.zeros(n)),
+                'Pitch': ('slow_time', np.zeros(n)),
+                'Roll': ('slow_time', np.zeros(n)),
+                'Surface': ('slow_time', self.surface_twtt[traces]),
+                'Bottom': ('slow_time', self.bed_twtt[traces]),
+            }, coords={'slow_time': self.slow_time[traces], 'twtt': twtt},
+               attrs={'season': season_name, 'segment': flight_id, 'source_url': f'synthetic://{flight_id}/{i:03d}'}))
+        return frames
+
+    def get_layers_db(self, flight_line):
+        return {
+            layer_id: xr.Dataset({'twtt': ('slow_time', layer_twtt)}, coords={'slow_time': self.slow_time})
+            for layer_id, layer_twtt in ((1, self.surface_twtt), (2, self.bed_twtt))
+        }
+
+    get_layers_files = get_layers_db
+
+def synthetic_grid(n, spacing, field_names, seed=0):
+    """
+    A square float32 grid of smooth random fields with x/y axes, like BedMachine or a velocity mosaic.
+    """
+    rng = np.random.default_rng(seed)
+    x = spacing * np.arange(n) - spacing * n / 2
+    y = x[::-1].copy()
+    profile = np.sin(np.arange(n, dtype=np.float32) / 50)
+    data_vars = {}
+    for i, name in enumerate(field_names):
+        field = 1000 * (1 + np.outer(profile, np.roll(profile, 7 * i)))
+        field += rng.normal(size=(n, n)).astype(np.float32)
+        field[:n // 20] = np.nan # Off-ice cells
+        data_vars[name] = (('y', 'x'), field)
+    return xr.Dataset(data_vars, coords={'x': x, 'y': y})
+
+def synthetic_points(ds_grid, n_points, seed=0):
+    """
+    Random points within the extent of ds_grid, laid out like the radar datasets (x and y along 'index').
+    """
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(ds_grid.x.min(), ds_grid.x.max(), n_points)
+    y = rng.uniform(ds_grid.y.min(), ds_grid.y.max(), n_points)
+    return xr.Dataset({'x': ('index', x), 'y': ('index', y)}, coords={'index': np.arange(n_points)})
+
+# Targets. Each setup function builds synthetic inputs that grow linearly with scale and returns
+# (run, input_bytes), where run() calls the entry point and input_bytes is the size of the input
+# that its memory is expected to grow with.
+
+BEDMACHINE_FIELDS = ['thickness', 'errbed', 'mask', 'surface']
+
+def _setup_calculate_rssnr(scale, work_dir):
+    from snrfinder import calculate_rssnr
+    csv_path, mat_path = synthetic_cresis_frame(os.path.join(work_dir, 'frame'), 'Data_20161026_05_001', n_traces=int(2000 * scale))
+    return (lambda: calculate_rssnr(csv_path, mat_path, ice_sheet='antarctica', save_plot=False)), os.path.getsize(mat_path)
+
+def _setup_raw_to_snr(scale, work_dir):
+    data_dir = os.path.join(work_dir, 'cresis_data')
+    segment_dir = os.path.join(data_dir, '2016_Antarctica_DC8', 'CSARP_standard', '20161026_05')
+    mat_paths = [synthetic_cresis_frame(segment_dir, f'Data_20161026_05_{i:03d}', n_traces=int(1000 * scale), seed=i)[1] for i in range(1, 4)]
+    argv = ['raw_to_snr.py', '--data', data_dir, '--dataset', 'Antarctica', '--output', os.path.join(work_dir, 'snr_data.csv')]
+
+    def run():
+        # raw_to_snr.py is a script, so run it as __main__ with its command line arguments
+        saved_argv = sys.argv
+        sys.argv = argv
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                runpy.run_path(os.path.join(REPO_DIR, 'data_preprocessing', 'raw_to_snr.py'), run_name='__main__')
+        finally:
+            sys.argv = saved_argv
+
+    # Frames are processed one at a time, so memory grows with the largest frame
+    return run, max(os.path.getsize(p) for p in mat_paths)
+
+def _setup_process_radar_line(scale, work_dir):
+    from radar_line_processing import process_radar_line
+    opr = SyntheticOPRConnection(traces_per_frame=int(3000 * scale))
+    output_dir = os.path.join(work_dir, 'reflectivity')
+    os.makedirs(output_dir, exist_ok=True)
+
+    def run():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            process_radar_line('20161026_05', '2016_Antarctica_DC8', output_dir, return_dataset=False, opr_connection=opr)
+
+    return run, opr.input_bytes
+
+def _setup_interpolate_nearest_from_grid(scale, work_dir):
+    from interpolation_utils import interpolate_nearest_from_grid
+    ds_grid = synthetic_grid(int(1500 * math.sqrt(scale)), 500.0, BEDMACHINE_FIELDS)
+    ds_points = synthetic_points(ds_grid, int(200_000 * scale))
+    return (lambda: interpolate_nearest_from_grid(ds_grid, ds_points, BEDMACHINE_FIELDS)), ds_grid.nbytes
+
+def _setup_interpolate_from_regular_grid(scale, work_dir):
+    from interpolation_utils import interpolate_from_regular_grid
+    ds_grid = synthetic_grid(int(1500 * math.sqrt(scale)), 500.0, BEDMACHINE_FIELDS)
+    ds_points = synthetic_points(ds_grid, int(200_000 * scale))
+    return (lambda: interpolate_from_regular_grid(ds_grid, ds_points, BEDMACHINE_FIELDS, method='linear')), ds_grid.nbytes
+
+def _setup_resample_block_mean(scale, work_dir):
+    from interpolation_utils import resample_block_mean
+    ds_grid = synthetic_grid(int(2000 * math.sqrt(scale)), 450.0, ['speed', 'speed_err'])
+    x = np.arange(ds_grid.x.min() + 500, ds_grid.x.max() - 500, 1000.0)
+    ds_target = xr.Dataset(coords={'x': x, 'y': x[::-1].copy()})
+    return (lambda: resample_block_mean(ds_grid, ds_target, ['speed', 'speed_err'])), ds_grid.nbytes
+
+# Profiled entry points.
+# - setup: Function (scale, work_dir) -> (run, input_bytes), see above
+# - production_input_bytes: Input size the recommendation is extrapolated to
+# - resource: The resource request the recommendation is for, and its current value
+TARGETS = {
+    'calculate_rssnr': {
+        'setup': _setup_calculate_rssnr,
+        'production_input_bytes': FRAME_BYTES,
+        'resource': "SLURM --mem-per-cpu, per CReSIS frame (slurm/run_raw_to_snr.sh requests 32G)",
+    },
+    'raw_to_snr': {
+        'setup': _setup_raw_to_snr,
+        'production_input_bytes': FRAME_BYTES,
+        'resource': "SLURM --mem-per-cpu for raw_to_snr.py (slurm/run_raw_to_snr.sh requests 32G)",
+    },
+    'process_radar_line': {
+        'setup': _setup_process_radar_line,
+        'production_input_bytes': FLIGHT_FRAMES * FRAME_BYTES,
+        'resource': "Dask MEMORY resource per flight in run_radar_line_processing.py (flight_scheduling.estimate_flight_cost)",
+    },
+    'interpolate_nearest_from_grid': {
+        'setup': _setup_interpolate_nearest_from_grid,
+        'production_input_bytes': BEDMACHINE_ANTARCTICA_BYTES,
+        'resource': "Dask memory_limit in interpolate_external_datasets.ipynb (60GB)",
+    },
+    'interpolate_from_regular_grid': {
+        'setup': _setup_interpolate_from_regular_grid,
+        'production_input_bytes': BEDMACHINE_ANTARCTICA_BYTES,
+        'resource': "Memory to interpolate the whole BedMachine grid at once",
+    },
+    'resample_block_mean': {
+        'setup': _setup_resample_block_mean,
+        'production_input_bytes': VELOCITY_ANTARCTICA_BYTES,
+        'resource': "Memory to resample the whole velocity mosaic at once (gridded_inputs.py works per tile)",
+    },
+}
+
+def profile_target(name, scale, work_dir, trace_allocations=False, sample_interval_s=0.02):
+    """
+    Build the synthetic inputs of a target at scale and measure one call of it in this process.
+
+    Use profile_targets, which runs each measurement in a fresh process, to get comparable peak RSS.
+
+    Returns:
+        dict: The target, scale and input_bytes, plus the measurements of ResourceMonitor.record
+    """
+    for d in SCRIPT_DIRS:
+        if d not in sys.path:
+            sys.path.insert(0, d)
+
+    run, input_bytes = TARGETS[name]['setup'](scale, work_dir)
+    with ResourceMonitor(sample_interval_s=sample_interval_s, trace_allocations=trace_allocations) as monitor:
+        run()
+    return {'target': name, 'scale': scale, 'input_bytes': input_bytes, 'traced': trace_allocations, **monitor.record()}
+
+def profile_targets(names=None, scales=(0.5, 1, 2), trace_allocations=True, sample_interval_s=0.02, work_dir=None):
+    """
+    Profile targets at each scale, each run in a fresh process so peak RSS isn't affected by earlier runs.
+
+    If trace_allocations is True, each target is run once more at the largest scale with allocation tracing.
+
+    Returns:
+        list of dict: One record per run (see profile_target). Failed runs have an 'error' instead of measurements.
+    """
+    names = names or list(TARGETS)
+    unknown = [n for n in names if n not in TARGETS]
+    if unknown:
+        raise ValueError(f"Unknown targets {unknown}. Options are: {list(TARGETS)}")
+
+    runs = [(n, s, False) for n in names for s in sorted(scales)]
+    if trace_allocations:
+        runs += [(n, max(scales), True) for n in names]
+
+    records = []
+    context = multiprocessing.get_context('spawn')
+    for name, scale, traced in runs:
+        run_dir = tempfile.mkdtemp(dir=work_dir)
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                record = executor.submit(profile_target, name, scale, run_dir, traced, sample_interval_s).result()
+        except Exception as e:
+            record = {'target': name, 'scale': scale, 'traced': traced, 'error': f"{type(e).__name__}: {e}"}
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+        if 'error' in record:
+            print(f"{name} (scale {scale}{', traced' if traced else ''}): failed with {record['error']}", flush=True)
+        else:
+            print(f"{name} (scale {scale}{', traced' if traced else ''}): {record['wall_s']:.1f} s, "
+                  f"peak RSS {record['peak_rss_bytes'] / 1e9:.2f} GB", flush=True)
+        records.append(record)
+    return records
+
+def _cpu_scaling_exponent(size, cpu, min_scales=3, min_r2=0.9):
+    """
+    Exponent of a power law fit of CPU time to input size (CPU time ~ size^exponent).
+
+    Falls back to linear scaling (1.0) with fewer than min_scales distinct sizes, when the log-log
+    fit explains less than min_r2 of the variance (e.g. CPU time dominated by fixed costs or noise),
+    or when the fitted exponent is negative, since more input never takes less work.
+    """
+    if len(np.unique(size)) < min_scales:
+        return 1.0
+    log_size, log_cpu = np.log(size), np.log(np.maximum(cpu, 1e-3))
+    exponent, offset = np.polyfit(log_size, log_cpu, 1)
+    residual = np.sum((log_cpu - (exponent * log_size + offset))**2)
+    total = np.sum((log_cpu - log_cpu.mean())**2)
+    r2 = 1 - residual / total if total > 0 else 0.0
+    if exponent < 0 or r2 < min_r2:
+        return 1.0
+    return exponent
+
+def recommend_resources(records, production_input_bytes=None, safety_factor=1.5):
+    """
+    Extrapolate the measurements of each target to its production input size.
+
+    Peak RSS is fitted as a linear function of input_bytes: the intercept is the fixed cost
+    (interpreter, libraries, fixed buffers) and the slope is the memory per input byte. CPU time is
+    fitted as a power law of input_bytes, since some targets are not linear in their input, if there
+    are at least 3 scales and the fit is good (see _cpu_scaling_exponent), and assumed proportional to
+    the input otherwise. With a single scale, peak RSS above the baseline is assumed proportional to the input.
+
+    Parameters:
+        records (list of dict): Records from profile_targets
+        production_input_bytes (dict): Target -> production input size, overriding TARGETS
+        safety_factor (float): Margin applied to the predicted peak RSS
+
+    Returns:
+        pd.DataFrame: One row per target with the fitted memory model, the predicted peak RSS and CPU
+        time at the production input size, and the recommended memory (in whole GB) and CPUs
+    """
+    production_input_bytes = {**{n: t['production_input_bytes'] for n, t in TARGETS.items()}, **(production_input_bytes or {})}
+    df = pd.DataFrame([r for r in records if 'error' not in r and not r['traced']])
+
+    rows = []
+    for name, runs in (df.groupby('target', sort=False) if len(df) else []):
+        size = runs['input_bytes'].to_numpy(dtype=np.float64)
+        peak = runs['peak_rss_bytes'].to_numpy(dtype=np.float64)
+        cpu = runs['cpu_s'].to_numpy(dtype=np.float64)
+        production = production_input_bytes[name]
+
+        largest = np.argmax(size)
+        if len(np.unique(size)) >= 2:
+            slope, intercept = np.polyfit(size, peak, 1)
+            slope = max(slope, 0.0)
+            intercept = peak[largest] - slope * size[largest]
+        else:
+            intercept = runs['baseline_rss_bytes'].iloc[largest]
+            slope = (peak[largest] - intercept) / size[largest]
+        exponent = _cpu_scaling_exponent(size, cpu)
+
+        predicted_peak = intercept + slope * production
+        rows.append({
+            'target': name,
+            'production_input_bytes': production,
+            'base_memory_bytes': intercept,
+            'memory_per_input_byte': slope,
+            'predicted_peak_rss_bytes': predicted_peak,
+            'recommended_memory_gb': math.ceil(safety_factor * predicted_peak / 1e9),
+            'cpu_utilization': runs['cpu_utilization'].max(),
+            'recommended_cpus': max(1, math.ceil(runs['cpu_utilization'].max() - 0.1)),
+            'cpu_scaling_exponent': exponent,
+            'predicted_cpu_s': cpu[largest] * (production / size[largest])**exponent,
+            'resource': TARGETS[name]['resource'],
+        })
+    return pd.DataFrame(rows)
+
+def format_report(records, recommendations, top_n=10):
+    """
+    Human-readable report of the measurements, recommendations and top allocation sites.
+    """
+    lines = ['Measurements', '============']
+    measured = pd.DataFrame([r for r in records if 'error' not in r and not r['traced']])
+    if len(measured):
+        table = measured[['target', 'scale', 'input_bytes', 'wall_s', 'cpu_s', 'cpu_utilization', 'peak_rss_bytes']].copy()
+        table['input_MB'] = table.pop('input_bytes') / 1e6
+        table['peak_rss_MB'] = table.pop('peak_rss_bytes') / 1e6
+        lines.append(table.to_string(index=False, float_format=lambda v: f'{v:.2f}'))
+    for r in records:
+        if 'error' in r:
+            lines.append(f"{r['target']} (scale {r['scale']}) failed: {r['error']}")
+
+    lines += ['', 'Recommendations', '===============']
+    for _, row in recommendations.iterrows():
+        lines += [
+            f"{row['target']}: {row['recommended_memory_gb']}G memory, {row['recommended_cpus']} CPU(s)",
+            f"    For: {row['resource']}",
+            f"    Model: {row['base_memory_bytes'] / 1e9:.2f} GB + {row['memory_per_input_byte']:.2f} x input, "
+            f"{row['predicted_peak_rss_bytes'] / 1e9:.2f} GB peak RSS at {row['production_input_bytes'] / 1e9:.2f} GB of input",
+            f"    Predicted CPU time: {row['predicted_cpu_s']:.0f} s (CPU time ~ input^{row['cpu_scaling_exponent']:.2f})",
+        ]
+
+    lines += ['', 'Allocations near peak traced memory', '===================================']
+    for r in records:
+        if r.get('traced') and 'error' not in r:
+            lines.append(f"{r['target']} (scale {r['scale']}, traced peak {r['traced_peak_bytes'] / 1e6:.1f} MB):")
+            for a in r['allocations'][:top_n]:
+                lines.append(f"    {a['size_bytes'] / 1e6:9.1f} MB {a['count']:8d} blocks  {a['site']}")
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the memory and CPU use of pipeline entry points on synthetic inputs and recommend resource requests.")
+    parser.add_argument('targets', type=str, nargs='*', help=f"Targets to profile. Default: all of {list(TARGETS)}")
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.5, 1, 2],
+                        help="Sizes of the synthetic inputs, relative to the default size. CPU scaling is only fitted with at least 3")
+    parser.add_argument('--production-input', type=str, action='append', default=[],
+                        help="Production input size of a target in bytes as name=bytes (e.g. process_radar_line=2e9). Repeat for each target")
+    parser.add_argument('--safety-factor', type=float, default=1.5, help="Margin applied to the predicted peak RSS")
+    parser.add_argument('--sample-interval', type=float, default=0.02, help="Interval between RSS samples in seconds")
+    parser.add_argument('--no-trace', action='store_true', help="Skip the runs that trace allocations by call site")
+    parser.add_argument('--work-dir', type=str, default=None, help="Directory for synthetic inputs and outputs. Default: the system temporary directory")
+    parser.add_argument('--output', type=str, default=None, help="Write the measurements and recommendations to this JSON file")
+    args = parser.parse_args()
+
+    production_input_bytes = {}
+    for item in args.production_input:
+        name, _, value = item.partition('=')
+        production_input_bytes[name] = float(value)
+
+    records = profile_targets(args.targets or None, scales=args.scales, trace_allocations=not args.no_trace,
+                              sample_interval_s=args.sample_interval, work_dir=args.work_dir)
+    recommendations = recommend_resources(records, production_input_bytes, safety_factor=args.safety_factor)
+    print()
+    print(format_report(records, recommendations))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'measurements': records, 'recommendations': recommendations.to_dict(orient='records')}, f, indent=2, default=float)